@@ -0,0 +1,83 @@
+"""
+Entry point de produção: o app Flet montado num servidor ASGI (uvicorn) com vários workers.
+
+    cd src && python asgi.py                      # WEB_CONCURRENCY workers (padrão: nº de CPUs)
+    cd src && uvicorn asgi:app --workers 4 ...    # o mesmo, chamando o uvicorn direto
+
+Cada worker é um processo com seu interpretador (seu GIL), sua engine/pool e sua
+thread de LISTEN do change feed; com mais de um worker use Postgres, senão as
+escritas de um worker não aparecem nas telas dos outros. As sessões Flet vivem
+no worker que abriu o websocket: um navegador que reconecta em outro worker
+começa uma sessão nova (volta ao login).
+
+main.py continua servindo o modo de processo único (desenvolvimento).
+"""
+import os
+from contextlib import asynccontextmanager
+
+import flet.fastapi as flet_fastapi
+from fastapi import FastAPI
+
+from main import main
+from controllers.gestao_controller import UPLOAD_DIR
+from database.config import engine, init_database, configure_logging
+from database import change_feed
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
+
+# Set by the __main__ launcher once the schema/seed ran, so the workers skip it
+DB_INIT_DONE = "COUNTS_DB_INIT_DONE"
+
+configure_logging()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Per-worker startup/shutdown."""
+    # Never share pooled connections created before this process started serving
+    engine.dispose(close=False)
+    if os.getenv(DB_INIT_DONE) != "1":
+        init_database()
+    change_feed.connect(engine)
+    await flet_fastapi.app_manager.start()
+    try:
+        yield
+    finally:
+        # Sessions first (they may still be using connections), then the LISTEN thread, then the pool
+        await flet_fastapi.app_manager.shutdown()
+        change_feed.disconnect()
+        engine.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
+app.mount("/", flet_fastapi.app(
+    main,
+    assets_dir=ASSETS_DIR,
+    upload_dir=UPLOAD_DIR, # Imports (CSV/XLSX) uploaded from the browser; shared by the workers
+    secret_key=os.getenv("FLET_SECRET_KEY"),
+))
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    port = int(os.getenv("PORT", 8400))
+    workers = int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+
+    if workers > 1 and engine.dialect.name != "postgresql":
+        print("⚠️  Vários workers sem Postgres: as telas de um worker não veem as escritas dos outros.")
+
+    # Schema/seed once, here, instead of racing in every worker
+    init_database()
+    os.environ[DB_INIT_DONE] = "1"
+    engine.dispose()
+
+    uvicorn.run(
+        "asgi:app",
+        host="0.0.0.0",
+        port=port,
+        workers=workers,
+        proxy_headers=True,
+        forwarded_allow_ips="*", # Behind Render's proxy
+        timeout_graceful_shutdown=int(os.getenv("GRACEFUL_SHUTDOWN_TIMEOUT", 20)),
+    )
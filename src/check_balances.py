@@ -0,0 +1,204 @@
+"""
+Confere (e opcionalmente corrige) o saldo/classificação gravado de todas as dívidas
+e o ledger de alocações (pagamento -> dívida).
+
+Pensado para rodar toda noite:
+
+    cd src && python check_balances.py                  # só relatório (sai com 1 se houver divergência)
+    cd src && python check_balances.py --repair         # corrige só os pares divergentes
+    cd src && python check_balances.py --workers 8 --chunk-users 1000
+
+Os usuários são divididos em faixas; cada faixa é lida em streaming (yield_per),
+agrupada por (usuário, categoria) e recalculada com balance_engine.replay e
+balance_engine.allocations — as mesmas regras de _recalculate_balances — num pool
+de processos, cada um com suas próprias conexões. Só os pares com divergência voltam para o processo principal.
+
+O reparo roda _recalculate_balances nesses pares (relendo os dados, então uma
+escrita feita depois da conferência não é sobrescrita com valores velhos), em
+transações de --batch pares, publicando as mudanças no change feed. Depois de um
+fechamento o recálculo normal só olha o que veio depois dele; pares com divergência
+em registros do período fechado são refeitos com o histórico inteiro (full=True),
+e antes disso os checkpoints dos fechamentos são recriados a partir dos registros
+(senão a próxima escrita recalcularia a partir do checkpoint velho).
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+from sqlalchemy import func, case
+from database.config import engine, session_scope
+from database.models import Registro, Alocacao
+from database import change_feed
+from repositories import balance_engine
+from repositories.balance_engine import to_cents
+from repositories.fechamento_repository import FechamentoRepository
+from repositories.transaction_repository import RegistroRepository
+
+# Rows fetched per round-trip while streaming a user range
+STREAM_BATCH = 5000
+
+
+def _init_worker():
+    # Pooled connections inherited through fork must not be shared with the parent
+    engine.dispose(close=False)
+
+
+def user_ranges(db, chunk_users: int):
+    """Splits the users that have records into [(first_id, last_id)] of chunk_users each."""
+    user_ids = [user_id for user_id, in db.query(Registro.user_id).distinct().order_by(Registro.user_id)]
+    return [
+        (user_ids[start], user_ids[min(start + chunk_users, len(user_ids)) - 1])
+        for start in range(0, len(user_ids), chunk_users)
+    ]
+
+
+def check_range(first_user_id: int, last_user_id: int):
+    """
+    Worker: recomputes every partition of a user range (balances and ledger).
+
+    Returns:
+        tuple: (rows read, [(user_id, category_id, [(what, stored, expected)], closed)]),
+            closed=True when a divergence involves a record dated up to the last close
+    """
+    with session_scope() as db:
+        repo = RegistroRepository(db)
+        in_range = Registro.user_id.between(first_user_id, last_user_id)
+        last_close = repo._last_close()
+        closed_until = last_close.data_fechamento if last_close else None
+
+        # Net ledger of the range, keyed by the debt's partition
+        ledger = {}
+        for user_id, category_id, payment_id, debt_id, cents in db.query(
+            Registro.user_id, Registro.category_id, Alocacao.payment_id, Alocacao.debt_id,
+            func.sum(Alocacao.valor_centavos)
+        ).join(Registro, Registro.id == Alocacao.debt_id).filter(in_range).group_by(
+            Registro.user_id, Registro.category_id, Alocacao.payment_id, Alocacao.debt_id
+        ):
+            if cents:
+                ledger.setdefault((user_id, category_id), {})[(payment_id, debt_id)] = cents
+
+        rows = db.query(
+            Registro.id, Registro.user_id, Registro.category_id, Registro.type_id,
+            Registro.valor, Registro.saldo, Registro.classificacao_id,
+            case((Registro.type_id == 0, Registro.data_debito), else_=Registro.data_entrada).label("data")
+        ).filter(in_range).order_by(
+            Registro.user_id, Registro.category_id, *repo._partition_order()
+        ).yield_per(STREAM_BATCH)
+
+        read = 0
+        drifted = []
+        for (user_id, category_id), partition in groupby(rows, key=lambda r: (r.user_id, r.category_id)):
+            partition = list(partition)
+            read += len(partition)
+            debts = [r for r in partition if r.type_id == 0]
+            payments = [(r.id, to_cents(r.valor)) for r in partition if r.type_id == 1]
+            expected = balance_engine.replay([(d.id, d.valor) for d in debts], sum(c for _, c in payments))
+
+            closed_ids = {
+                r.id for r in partition if closed_until and r.data is not None and r.data <= closed_until
+            }
+            drifted_ids = set()
+
+            diff = []
+            for d in debts:
+                if (d.saldo, d.classificacao_id) != expected[d.id]:
+                    diff.append((f"dívida {d.id}: (saldo, classificação)", (d.saldo, d.classificacao_id), expected[d.id]))
+                    drifted_ids.add(d.id)
+
+            stored = ledger.pop((user_id, category_id), {})
+            allocated = {
+                (p, d): cents
+                for p, d, cents in balance_engine.allocations([(d.id, to_cents(d.valor)) for d in debts], payments)
+            }
+            for p, d in sorted(stored.keys() | allocated.keys()):
+                if stored.get((p, d)) != allocated.get((p, d)):
+                    diff.append((f"alocação {p}->{d}: centavos", stored.get((p, d)), allocated.get((p, d))))
+                    drifted_ids.update((p, d))
+            if diff:
+                drifted.append((user_id, category_id, diff, bool(drifted_ids & closed_ids)))
+        return read, drifted
+
+
+def check(workers: int, chunk_users: int):
+    """Runs check_range over every user range in a process pool; returns (rows read, drifted partitions)."""
+    with session_scope() as db:
+        ranges = user_ranges(db, chunk_users)
+
+    if not ranges:
+        return 0, []
+    firsts, lasts = zip(*ranges)
+
+    read, drifted = 0, []
+    if workers <= 1 or len(ranges) <= 1:
+        results = map(check_range, firsts, lasts)
+        for chunk_read, chunk_drifted in results:
+            read += chunk_read
+            drifted.extend(chunk_drifted)
+        return read, drifted
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        for chunk_read, chunk_drifted in executor.map(check_range, firsts, lasts):
+            read += chunk_read
+            drifted.extend(chunk_drifted)
+    return read, drifted
+
+
+def repair(drifted, batch: int):
+    """
+    Recomputes the drifted partitions, batch partitions per transaction.
+
+    Partitions drifted inside a closed period are replayed from the whole history:
+    the checkpoint-based recompute never reads (or writes) those rows. The close
+    checkpoints are rebuilt first, since a fix inside a closed period (or a
+    drift after it caused by a stale checkpoint) makes them stale too.
+    """
+    with session_scope() as db:
+        FechamentoRepository(db).rebuild_checkpoints()
+        db.commit()
+    for start in range(0, len(drifted), batch):
+        with session_scope() as db:
+            repo = RegistroRepository(db)
+            for user_id, category_id, _, closed in drifted[start:start + batch]:
+                repo._recalculate_balances(user_id, category_id, commit=False, full=closed)
+            repo._commit()
+
+
+def report(drifted, max_lines: int):
+    for user_id, category_id, diff, closed in drifted[:max_lines]:
+        where = " (período fechado)" if closed else ""
+        print(f"❌ usuário {user_id}, categoria {category_id}{where}: {len(diff)} divergência(s)")
+        for what, stored, expected in diff[:5]:
+            print(f"     {what} gravado {stored} != esperado {expected}")
+    if len(drifted) > max_lines:
+        print(f"   ... e mais {len(drifted) - max_lines} pares")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Confere saldo/classificação das dívidas e o ledger com o abatimento FIFO.")
+    parser.add_argument("--repair", action="store_true", help="corrige os pares (usuário, categoria) divergentes")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processos de conferência")
+    parser.add_argument("--chunk-users", type=int, default=500, help="usuários por tarefa")
+    parser.add_argument("--batch", type=int, default=100, help="pares corrigidos por transação")
+    parser.add_argument("--max-lines", type=int, default=50, help="pares listados no relatório")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    read, drifted = check(args.workers, args.chunk_users)
+    mismatches = sum(len(diff) for _, _, diff, _ in drifted)
+    print(f"🔎 {read} registros conferidos em {time.perf_counter() - start:.2f}s "
+          f"({args.workers} workers): {len(drifted)} pares / {mismatches} divergências")
+    report(drifted, args.max_lines)
+
+    if drifted and args.repair:
+        # Open screens (other processes) get the corrected rows
+        change_feed.connect(engine, listen=False)
+        start = time.perf_counter()
+        repair(drifted, args.batch)
+        print(f"✅ {len(drifted)} pares corrigidos em {time.perf_counter() - start:.2f}s")
+    elif drifted:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,35 +1,36 @@
 import flet as ft
-from database.config import SessionLocal
+from datetime import datetime
+from database.config import session_scope
 from repositories.transaction_repository import RegistroRepository
+from repositories.lookup_cache import categorias_cache
 from controllers.geral_controller import criar_recibo
 
 class DashboardController:
     def __init__(self, page: ft.Page):
         self.page = page
         self.view = None
-        self.db = SessionLocal()
-        self.trans_repo = RegistroRepository(self.db)
 
     def set_view(self, view):
         self.view = view
 
     def get_finance_data(self, user_id):
         ### Mock data simulation
-        registros = self.trans_repo.get_by_user(user_id)
+        with session_scope() as db:
+            registros = RegistroRepository(db).get_by_user(user_id)
 
-        # Agrupar registros por categoria com soma de valores
-        grouped_data = {}
-        for registro in registros:
-            categoria = registro.categoria_rel.categoria
-            valor = registro.valor
-            if categoria in grouped_data:
-                grouped_data[categoria] += valor # Soma o valor se a categoria já existir
-            else:
-                grouped_data[categoria] = valor # Adiciona o valor se ainda não existir
+            # Agrupar registros por categoria com soma de valores
+            grouped_data = {}
+            for registro in registros:
+                categoria = registro.categoria_rel.categoria
+                valor = registro.valor
+                if categoria in grouped_data:
+                    grouped_data[categoria] += valor # Soma o valor se a categoria já existir
+                else:
+                    grouped_data[categoria] = valor # Adiciona o valor se ainda não existir
 
-        total_contribuicoes = sum(registro.valor for registro in registros if registro.type_id == 0)
+            total_contribuicoes = sum(registro.valor for registro in registros if registro.type_id == 0)
 
-        total_dividas = sum(registro.valor for registro in registros if registro.type_id == 1)
+            total_dividas = sum(registro.valor for registro in registros if registro.type_id == 1)
         return {
             "total_contribuicoes": total_contribuicoes,
             "dividas": grouped_data,
@@ -43,16 +44,55 @@ class DashboardController:
         }
 
     def get_dividas_data(self, user_id):
-        registros = self.trans_repo.get_divi_by_user(user_id)
-        
+        return self.summarize_debts(self.get_open_debts(user_id))
+
+    def get_open_debts(self, user_id):
+        """Returns the user's open debts as {id: {'categoria', 'saldo', 'creado_em'}}."""
+        with session_scope() as db:
+            registros = RegistroRepository(db).get_divi_by_user(user_id)
+            return {
+                registro.id: {
+                    "categoria": registro.categoria_rel.categoria,
+                    "saldo": registro.saldo, # Use remaining balance (saldo) instead of original value
+                    "creado_em": registro.creado_em # Changed from data_debito to creado_em
+                }
+                for registro in registros
+            }
+
+    def apply_debt_events(self, open_debts, user_id, events):
+        """
+        Applies change feed events (database/change_feed.py) to open_debts in place.
+
+        Returns True if the user's open debts changed (a debt created, paid down,
+        paid off, deleted or moved to another user).
+        """
+        changed = False
+        with session_scope() as db:
+            for event in events:
+                if event["type_id"] != 0:
+                    continue
+                is_open = (event["user_id"] == user_id and not event["deleted"]
+                           and event["classificacao_id"] != 3) # Pago
+                if is_open:
+                    open_debts[event["id"]] = {
+                        "categoria": categorias_cache.get_name(db, event["category_id"]),
+                        "saldo": event["saldo"],
+                        "creado_em": datetime.fromisoformat(event["creado_em"])
+                    }
+                    changed = True
+                elif open_debts.pop(event["id"], None):
+                    changed = True
+        return changed
+
+    def summarize_debts(self, open_debts):
         # Dictionary to hold aggregated data
         # Structure: { 'CategoryName': {'total': float, 'latest_date': datetime} }
         aggregated_data = {}
 
-        for registro in registros:
-            categoria = registro.categoria_rel.categoria
-            valor = registro.saldo # Use remaining balance (saldo) instead of original value
-            data = registro.creado_em # Changed from data_debito to creado_em
+        for debt in open_debts.values():
+            categoria = debt["categoria"]
+            valor = debt["saldo"]
+            data = debt["creado_em"]
 
             if categoria not in aggregated_data:
                 aggregated_data[categoria] = {
@@ -1,8 +1,10 @@
 import flet as ft
 
-def criar_recibo(nome: str, cpf: str, valor: str):
+def criar_recibo(nome: str, cpf: str, valor: str, referente_a: str = None):
     """
     Gera um container Flet com o layout gráfico do recibo.
+
+    referente_a descreve o que foi pago (ex.: as dívidas quitadas pelo pagamento).
     """
     # --- 1. Variáveis de Valores ---
     empresa_nome = "CEBUDV - N. MESTRE VICENTE MARQUES"
@@ -16,7 +18,7 @@ def criar_recibo(nome: str, cpf: str, valor: str):
     cliente_nome = nome
     cliente_doc = cpf
     texto_valor_extenso = "Cento e Vinte Reais"
-    referente_a = "pagamento total da parcela 'Associação (Mensalidade R$ 60,00 e Joia R$ 60,00)'."
+    referente_a = referente_a or "pagamento total da parcela 'Associação (Mensalidade R$ 60,00 e Joia R$ 60,00)'."
     
     texto_corpo = f"Recebi de {cliente_nome}, CNPJ/CPF: {cliente_doc}, a importância de {texto_valor_extenso} referente ao {referente_a}"
     texto_legal = "Para confirmar a veracidade deste documento e da quantia paga, assino neste documento firmando o presente recibo nesta data."
@@ -1,9 +1,32 @@
+import csv
+import os
+import uuid
 import flet as ft
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime, date
-from database.config import SessionLocal
+from sqlalchemy.orm import object_session
+from database.config import session_scope, DB_POOL_SIZE
 from repositories.user_repository import UsuarioRepository
-from repositories.transaction_repository import RegistroRepository, CategoriasRepository
+from repositories.transaction_repository import RegistroRepository, PeriodoFechadoError
+from repositories.fechamento_repository import FechamentoRepository
+from repositories.balance_engine import to_cents
+from repositories.lookup_cache import categorias_cache, classificacoes_cache, user_directory_cache
+from database import change_feed
 from controllers.geral_controller import criar_recibo
+from models.dto_change_set import ChangeSet
+
+# Page size for the Dívidas/Entradas lists (more pages load on scroll)
+PAGE_SIZE = 50
+
+# Where Flet stores files uploaded from the browser (imports)
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "uploads"))
+
+# Accepted spellings of the 'tipo' column in imported files
+IMPORT_TYPES = {
+    "DEBT": "DEBT", "DIVIDA": "DEBT", "DÍVIDA": "DEBT",
+    "PAYMENT": "PAYMENT", "ENTRADA": "PAYMENT", "PAGAMENTO": "PAYMENT",
+}
 
 class GestaoController:
     """
@@ -13,11 +36,9 @@ class GestaoController:
     def __init__(self, page: ft.Page):
         self.page = page
         self.view = None
-        
-        self.db = SessionLocal()
-        self.user_repo = UsuarioRepository(self.db)
-        self.trans_repo = RegistroRepository(self.db)
-        self.cat_repo = CategoriasRepository(self.db)
+        # No long-lived session: each action opens its own unit of work (session_scope)
+        # Tags this session's change feed messages (see _write_scope)
+        self.session_id = uuid.uuid4().hex
 
     def set_view(self, view):
         """Sets the reference to the View."""
@@ -26,23 +47,29 @@ class GestaoController:
     # ==========================
     # Transformers (Model -> Dict)
     # ==========================
-    def _user_to_dict(self, user):
+    def _user_to_dict(self, user, balance=None):
         """Converts User DB object to dictionary for View compatibility."""
         if not user: return {}
         
-        # Calculate balance dynamically
-        balance = self.trans_repo.get_user_balance(user.id)
+        # Calculate balance dynamically (unless precomputed in bulk)
+        if balance is None:
+            with session_scope() as db:
+                balance = RegistroRepository(db).get_user_balance(user.id)
         
+        return self._user_dict(user.id, user.cpf, user.nome, balance, user.is_admin, user.senha)
+
+    def _user_dict(self, user_id, cpf, nome, balance, is_admin=False, senha=None):
+        """Card dict of a user (same keys/order for DB rows and change events)."""
         return {
-            "id": user.id,
-            "cpf": user.cpf,
-            "nome": user.nome,
+            "id": user_id,
+            "cpf": cpf,
+            "nome": nome,
             "pendente": balance['pendente'],
             "pagos": balance['pagos'],
             "maior_pago": balance['maior_pago'],
             "divida_antiga": balance['divida_antiga'],
-            "is_admin": user.is_admin,
-            "senha": user.senha
+            "is_admin": is_admin,
+            "senha": senha
         }
 
     def _trans_to_dict(self, trans):
@@ -56,6 +83,9 @@ class GestaoController:
         user_name = trans.usuario.nome if trans.usuario else "Desconhecido"
         user_cpf = trans.usuario.cpf if trans.usuario else ""
         category_name = trans.categoria_rel.categoria if trans.categoria_rel else "Sem Categoria"
+        classificacao_name = ""
+        if trans.classificacao_id:
+            classificacao_name = classificacoes_cache.get_name(object_session(trans), trans.classificacao_id) or ""
 
         # Safe date formatting
         data_divida_str = trans.data_debito.strftime("%Y-%m-%d") if trans.data_debito else ""
@@ -65,32 +95,124 @@ class GestaoController:
         # If DEBT, we show 'data_divida' as primary 'data', but maybe view needs explicit fields
         # Previously we mashed into 'data'. Now we serve explicit keys.
         
+        return self._trans_dict(trans.id, user_cpf, user_name, category_name, trans.category_id, trans.valor,
+                                data_divida_str, data_prevista_str, data_entrada_str, type_str, classificacao_name)
+
+    def _trans_dict(self, trans_id, cpf, nome, categoria, categoria_id, valor,
+                    data_divida, data_prevista, data_entrada, type_str, classificacao):
+        """Card dict of a transaction (same keys/order for DB rows and change events)."""
         return {
-            "id": trans.id,
-            "cpf": user_cpf,
-            "nome": user_name,
-            "categoria": category_name,
-            "categoria_id": trans.category_id,  # ID da categoria para uso em dropdowns
-            "valor": trans.valor, 
-            "data_divida": data_divida_str,
-            "data_prevista": data_prevista_str,
-            "data_entrada": data_entrada_str,
-            "data": data_divida_str if type_str == 'DEBT' else data_entrada_str, # Legacy/Compat field?
-            "type": type_str
+            "id": trans_id,
+            "cpf": cpf,
+            "nome": nome,
+            "categoria": categoria,
+            "categoria_id": categoria_id,  # ID da categoria para uso em dropdowns
+            "valor": valor, 
+            "data_divida": data_divida,
+            "data_prevista": data_prevista,
+            "data_entrada": data_entrada,
+            "data": data_divida if type_str == 'DEBT' else data_entrada, # Legacy/Compat field?
+            "type": type_str,
+            "classificacao": classificacao
         }
+
+    def transactions_from_events(self, events):
+        """
+        Converts change feed events (database/change_feed.py) into transaction dicts.
+
+        Names come from the process caches (directory, categories, classifications),
+        so in the steady state no query is made.
+        """
+        if not events:
+            return []
+        with session_scope() as db:
+            items = []
+            for event in events:
+                user = user_directory_cache.get_by_id(db, event["user_id"]) or {}
+                classificacao_name = ""
+                if event["classificacao_id"]:
+                    classificacao_name = classificacoes_cache.get_name(db, event["classificacao_id"]) or ""
+                items.append(self._trans_dict(
+                    event["id"],
+                    user.get("cpf", ""),
+                    user.get("nome", "Desconhecido"),
+                    categorias_cache.get_name(db, event["category_id"]) or "Sem Categoria",
+                    event["category_id"],
+                    event["valor"],
+                    event["data_debito"] or "",
+                    event["data_prevista"] or "",
+                    event["data_entrada"] or "",
+                    'DEBT' if event["type_id"] == 0 else 'PAYMENT',
+                    classificacao_name
+                ))
+            return items
+
+    def user_from_event(self, event):
+        """Builds the card dict of a user created in another session (change feed event)."""
+        return self._user_dict(event["id"], event["cpf"], event["nome"], event["balance"])
+
+    @contextmanager
+    def _write_scope(self):
+        """
+        session_scope for a write whose result this controller shows itself (apply_changes).
+
+        The change feed messages it publishes carry this session's id, so the view
+        skips its own copy instead of patching (and repainting) a second time.
+        """
+        with change_feed.origin(self.session_id), session_scope() as db:
+            yield db
+
+    def run_concurrently(self, tasks):
+        """
+        Runs independent read tasks in parallel and returns their results in order.
+
+        Each task opens its own session_scope, so each gets its own pooled connection
+        (at most DB_POOL_SIZE at once): the wait is the slowest read, not the sum.
+        """
+        if len(tasks) <= 1:
+            return [task() for task in tasks]
+        with ThreadPoolExecutor(max_workers=min(len(tasks), DB_POOL_SIZE)) as executor:
+            futures = [executor.submit(task) for task in tasks]
+            return [future.result() for future in futures]
+
     def _update_view_gests(self):
         self.view.update_usuarios_table()
         self.view.update_dividas_table()
         self.view.update_entradas_table()
 
+    def _changes_from(self, repo, record_ids=(), removed_record_ids=()):
+        """Builds the ChangeSet of a write from the rows/users the RegistroRepository touched."""
+        removed = set(removed_record_ids)
+        return ChangeSet(
+            record_ids=(set(record_ids) | repo.touched_ids) - removed,
+            new_record_ids=set(repo.created_ids),
+            removed_record_ids=removed,
+            user_ids=set(repo.touched_user_ids),
+        )
+
     # ==========================
     # User Management
     # ==========================
 
-    def get_usuarios(self):
-        """Returns the list of users as dicts."""
-        users = self.user_repo.get_all()
-        return [self._user_to_dict(u) for u in users]
+    def get_usuarios(self, search_term="", offset=0, limit=PAGE_SIZE):
+        """Returns a page of users (with balances) matching the search term and the total found."""
+        with session_scope() as db:
+            users, total = UsuarioRepository(db).search(search_term, limit=limit, offset=offset)
+            # One grouped query for the page's balances instead of one round-trip set per user
+            balances = RegistroRepository(db).get_user_balances([u.id for u in users])
+            return [self._user_to_dict(u, balances[u.id]) for u in users], total
+
+    def get_usuarios_by_ids(self, user_ids):
+        """Returns the given users (with balances) as dicts (used to patch cards after a write)."""
+        with session_scope() as db:
+            users = UsuarioRepository(db).get_by_ids(user_ids)
+            balances = RegistroRepository(db).get_user_balances([u.id for u in users])
+            return [self._user_to_dict(u, balances[u.id]) for u in users]
+
+    def get_user_directory(self):
+        """Returns [{'id', 'cpf', 'nome'}] for dropdowns/pickers (cached, no balances)."""
+        with session_scope() as db:
+            return UsuarioRepository(db).get_directory()
 
     def add_usuario(self, data):
         """
@@ -98,16 +220,25 @@ class GestaoController:
         Also handles the initial transaction (debt or payment) if provided.
         """
         # Create User
-        new_user = self.user_repo.create(data['cpf'], data['nome'])
+        with self._write_scope() as db:
+            new_user = UsuarioRepository(db).create(data['cpf'], data['nome'])
+            new_user_id = new_user.id if new_user else None
         
         if not new_user:
             self.view.show_message("Erro: CPF já cadastrado!", ft.Colors.RED)
             return
 
         # Add Initial Transaction
-        self._add_debt_or_payment(data)
+        try:
+            changes = self._add_debt_or_payment(data) or ChangeSet()
+        except PeriodoFechadoError as e:
+            self.view.apply_changes(ChangeSet(user_ids={new_user_id}, new_user_ids={new_user_id}))
+            self.view.show_message(f"Usuário adicionado, mas a transação não: {e}", ft.Colors.RED)
+            return
+        changes.user_ids.add(new_user_id)
+        changes.new_user_ids.add(new_user_id)
 
-        self._update_view_gests()
+        self.view.apply_changes(changes)
         self.view.show_message("Usuário adicionado com sucesso!", ft.Colors.GREEN)
 
     def update_usuario(self, data):
@@ -116,14 +247,33 @@ class GestaoController:
         # Only update password if provided and not empty
         senha_arg = senha if senha else None
         
-        self.user_repo.update(data['cpf'], nome=data['nome'], senha=senha_arg)
-        self._update_view_gests()
+        with self._write_scope() as db:
+            user = UsuarioRepository(db).update(data['cpf'], nome=data['nome'], senha=senha_arg)
+            # The name is shown on the user's card and on every transaction card of theirs
+            changes = ChangeSet(
+                record_ids={r.id for r in user.registros} if user else set(),
+                user_ids={user.id} if user else set()
+            )
+        self.view.apply_changes(changes)
         self.view.show_message("Usuário atualizado com sucesso!", ft.Colors.GREEN)
 
     def delete_usuario(self, cpf):
         """Removes a user from the DB."""
-        if self.user_repo.delete(cpf):
-            self._update_view_gests()
+        try:
+            with self._write_scope() as db:
+                user = UsuarioRepository(db).get_by_cpf(cpf)
+                # Records go with the user (delete-orphan cascade), so their cards go too
+                changes = ChangeSet(
+                    removed_record_ids={r.id for r in user.registros} if user else set(),
+                    removed_user_ids={user.id} if user else set()
+                )
+                deleted = UsuarioRepository(db).delete(cpf)
+        except PeriodoFechadoError as e:
+            self.view.show_message(f"Usuário não removido: {e}", ft.Colors.RED)
+            return
+
+        if deleted:
+            self.view.apply_changes(changes)
             self.view.show_message("Usuário removido com sucesso!", ft.Colors.GREEN)
         else:
             self.view.show_message("Erro ao remover usuário.", ft.Colors.RED)
@@ -132,51 +282,44 @@ class GestaoController:
     # Transaction Management (Dividas/Entradas)
     # ==========================
 
-    def get_dividas(self, search_term=""):
-        """Returns a filtered list of debts."""
-        all_debts = self.trans_repo.get_by_type('DEBT')
-        # Convert to dicts
-        results = [self._trans_to_dict(d) for d in all_debts]
-        
-        if not search_term:
-            return results
-                
-        search = search_term.lower()
-        return [d for d in results if 
-                search in d['cpf'].lower() or 
-                search in d['nome'].lower() or 
-                search in d['categoria'].lower()]
-
-    def get_entradas(self, search_term=""):
-        """Returns a filtered list of payments."""
-        all_payments = self.trans_repo.get_by_type('PAYMENT')
-        # Convert to dicts
-        results = [self._trans_to_dict(p) for p in all_payments]
-        
-        if not search_term:
-            return results
-            
-        search = search_term.lower()
-        return [p for p in results if 
-                search in p['cpf'].lower() or 
-                search in p['nome'].lower() or 
-                search in p['categoria'].lower()]
+    def get_dividas(self, search_term="", offset=0, limit=PAGE_SIZE):
+        """Returns a page of debts matching the search term and the total found."""
+        with session_scope() as db:
+            debts, total = RegistroRepository(db).search('DEBT', search_term, limit=limit, offset=offset)
+            return [self._trans_to_dict(d) for d in debts], total
+
+    def get_entradas(self, search_term="", offset=0, limit=PAGE_SIZE):
+        """Returns a page of payments matching the search term and the total found."""
+        with session_scope() as db:
+            payments, total = RegistroRepository(db).search('PAYMENT', search_term, limit=limit, offset=offset)
+            return [self._trans_to_dict(p) for p in payments], total
+
+    def get_transactions(self, record_ids):
+        """Returns the given debts/payments as dicts (used to patch cards after a write)."""
+        with session_scope() as db:
+            return [self._trans_to_dict(t) for t in RegistroRepository(db).get_by_ids(record_ids)]
 
     def add_transaction(self, data):
         """Adds a debt or payment to an existing user."""
-        self._add_debt_or_payment(data)
-        self._update_view_gests()
+        try:
+            changes = self._add_debt_or_payment(data)
+        except PeriodoFechadoError as e:
+            self.view.show_message(str(e), ft.Colors.RED)
+            return
+        if changes is None:
+            self.view.show_message("Erro: usuário não encontrado.", ft.Colors.RED)
+            return
+        self.view.apply_changes(changes)
         self.view.show_message("Transação adicionada com sucesso!", ft.Colors.GREEN)
 
     def _add_debt_or_payment(self, data):
-        """Helper to process a generic transaction data dict."""
-        valor = float(str(data['valor']).replace(',', '.')) if data['valor'] else 0.0
-        
-        # Find User ID
-        user = self.user_repo.get_by_cpf(data['cpf'])
-        if not user:
-            return # Should handle error
+        """
+        Helper to process a generic transaction data dict.
 
+        Returns the ChangeSet of the write, or None if the user does not exist.
+        The caller applies it to the view.
+        """
+        valor = float(str(data['valor']).replace(',', '.')) if data['valor'] else 0.0
         transaction_type = 'PAYMENT' if data.get('is_pago') else 'DEBT'
         
         # Parse Dates
@@ -195,16 +338,23 @@ class GestaoController:
             except ValueError:
                 pass # Ignore invalid format
 
-        self.trans_repo.create(
-            user_id=user.id,
-            type=transaction_type,
-            category=data['categoria'],
-            amount=valor,
-            date_obj=date_obj,
-            data_prevista=data_prevista
-        )
-        self.view.update_reports()
-        self._update_view_gests()
+        with self._write_scope() as db:
+            # Find User ID
+            user = UsuarioRepository(db).get_by_cpf(data['cpf'])
+            if not user:
+                return None
+
+            repo = RegistroRepository(db)
+            repo.create(
+                user_id=user.id,
+                type=transaction_type,
+                category=data['categoria'],
+                amount=valor,
+                date_obj=date_obj,
+                data_prevista=data_prevista
+            )
+            # The new id is already known (no reload of the committed row)
+            return self._changes_from(repo, record_ids=repo.created_ids)
 
     def update_transaction(self, data, transaction_type):
         """Updates an existing transaction."""
@@ -223,21 +373,23 @@ class GestaoController:
              except ValueError:
                 pass
 
-        self.trans_repo.update(
-            trans_id=data['id'],
-            category=data['categoria'],
-            amount=val,
-            date_obj=date_obj,
-            data_prevista=data_prevista,
-            new_user_cpf=data['cpf']
-        )
+        try:
+            with self._write_scope() as db:
+                repo = RegistroRepository(db)
+                repo.update(
+                    trans_id=data['id'],
+                    category=data['categoria'],
+                    amount=val,
+                    date_obj=date_obj,
+                    data_prevista=data_prevista,
+                    new_user_cpf=data['cpf']
+                )
+                changes = self._changes_from(repo, record_ids={data['id']})
+        except PeriodoFechadoError as e:
+            self.view.show_message(str(e), ft.Colors.RED)
+            return
         
-        if transaction_type == "divida":
-            self.view.update_dividas_table()
-        else:
-            self.view.update_entradas_table()
-            
-        self.view.update_usuarios_table() # Update stats
+        self.view.apply_changes(changes)
         self.view.show_message("Transação atualizada com sucesso!", ft.Colors.GREEN)
 
     def add_divida(self, cpf, categoria, valor, data):
@@ -246,7 +398,11 @@ class GestaoController:
         payload = {
             'cpf': cpf, 'categoria': categoria, 'valor': valor, 'data': data, 'is_pago': False
         }
-        self._add_debt_or_payment(payload)
+        try:
+            self.view.apply_changes(self._add_debt_or_payment(payload) or ChangeSet())
+        except PeriodoFechadoError as e:
+            self.view.show_message(str(e), ft.Colors.RED)
+            return
         self.view.show_message("Dívida adicionada com sucesso!", ft.Colors.GREEN)
 
     def add_entrada(self, cpf, categoria, valor, data):
@@ -255,21 +411,143 @@ class GestaoController:
         payload = {
             'cpf': cpf, 'categoria': categoria, 'valor': valor, 'data': data, 'is_pago': True
         }
-        self._add_debt_or_payment(payload)
+        try:
+            self.view.apply_changes(self._add_debt_or_payment(payload) or ChangeSet())
+        except PeriodoFechadoError as e:
+            self.view.show_message(str(e), ft.Colors.RED)
+            return
         self.view.show_message("Entrada adicionada com sucesso!", ft.Colors.GREEN)
 
     def delete_transaction(self, trans_id):
         """Deletes a transaction."""
-        if self.trans_repo.delete(trans_id):
-            self._update_view_gests()
+        try:
+            with self._write_scope() as db:
+                repo = RegistroRepository(db)
+                deleted = repo.delete(trans_id)
+                changes = self._changes_from(repo, removed_record_ids={trans_id})
+        except PeriodoFechadoError as e:
+            self.view.show_message(str(e), ft.Colors.RED)
+            return
+
+        if deleted:
+            self.view.apply_changes(changes)
             self.view.show_message("Transação removida com sucesso!", ft.Colors.GREEN)
         else:
             self.view.show_message("Erro ao remover transação.", ft.Colors.RED)
 
+    # ==========================
+    # Import (CSV/XLSX)
+    # ==========================
+
+    def import_transactions(self, file_path):
+        """
+        Imports debts/payments from a CSV or XLSX file in a single bulk insert.
+
+        Expected columns: cpf, tipo (divida/entrada), categoria, valor, data and,
+        optionally, data_prevista. Rows with an unknown CPF or invalid values are skipped.
+        """
+        try:
+            rows = self._read_import_file(file_path)
+        except (OSError, ValueError, ImportError, csv.Error) as e:
+            self.view.show_message(f"Erro ao ler arquivo: {e}", ft.Colors.RED)
+            return
+
+        with self._write_scope() as db:
+            # Resolve users once, in memory
+            users = {u.cpf: u.id for u in UsuarioRepository(db).get_all()}
+
+            records = []
+            skipped = 0
+            for row in rows:
+                record = self._parse_import_row(row, users)
+                if record:
+                    records.append(record)
+                else:
+                    skipped += 1
+
+            if not records:
+                self.view.show_message("Nenhum registro válido encontrado no arquivo.", ft.Colors.RED)
+                return
+
+            try:
+                total = RegistroRepository(db).bulk_create(records)
+            except PeriodoFechadoError as e:
+                self.view.show_message(f"Importação cancelada. {e}", ft.Colors.RED)
+                return
+
+        self.view.update_reports()
+        self._update_view_gests()
+        message = f"{total} registros importados com sucesso!"
+        if skipped:
+            message += f" ({skipped} linhas ignoradas)"
+        self.view.show_message(message, ft.Colors.GREEN)
+
+    def import_uploaded_file(self, file_name):
+        """Imports a file previously uploaded from the browser to UPLOAD_DIR."""
+        self.import_transactions(os.path.join(UPLOAD_DIR, os.path.basename(file_name)))
+
+    def _read_import_file(self, file_path):
+        """Reads the import file as a list of dicts keyed by lower-case column name."""
+        if file_path.lower().endswith(".xlsx"):
+            from openpyxl import load_workbook # Optional: only needed for XLSX imports
+
+            sheet = load_workbook(file_path, read_only=True, data_only=True).active
+            lines = sheet.iter_rows(values_only=True)
+            header = [str(h or "").strip().lower() for h in next(lines, [])]
+            return [dict(zip(header, line)) for line in lines]
+
+        with open(file_path, newline="", encoding="utf-8-sig") as f:
+            sample = f.read(2048)
+            f.seek(0)
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;")
+            reader = csv.DictReader(f, dialect=dialect)
+            return [{(k or "").strip().lower(): v for k, v in row.items()} for row in reader]
+
+    def _parse_import_row(self, row, users):
+        """Converts one imported row into a bulk_create record (None if invalid)."""
+        user_id = users.get(str(row.get('cpf') or "").strip().zfill(11))
+        transaction_type = IMPORT_TYPES.get(str(row.get('tipo') or "").strip().upper())
+        categoria = str(row.get('categoria') or "").strip()
+        if not user_id or not transaction_type or not categoria:
+            return None
+
+        try:
+            valor = row['valor']
+            if not isinstance(valor, (int, float)):
+                valor = float(str(valor).replace(',', '.'))
+            date_obj = self._parse_import_date(row.get('data'))
+            data_prevista = self._parse_import_date(row.get('data_prevista')) if row.get('data_prevista') else None
+        except (KeyError, ValueError):
+            return None
+
+        return {
+            "user_id": user_id,
+            "type": transaction_type,
+            "category": categoria,
+            "amount": float(valor),
+            "date_obj": date_obj,
+            "data_prevista": data_prevista if transaction_type == 'DEBT' else None
+        }
+
+    def _parse_import_date(self, value):
+        """Accepts date/datetime cells, 'YYYY-MM-DD' or 'DD/MM/YYYY'."""
+        if isinstance(value, datetime):
+            return value.date()
+        if isinstance(value, date):
+            return value
+        value = str(value or "").strip()
+        for fmt in ("%Y-%m-%d", "%d/%m/%Y"):
+            try:
+                return datetime.strptime(value, fmt).date()
+            except ValueError:
+                continue
+        raise ValueError(f"Data inválida: {value}")
+
     def get_categorias(self):
         """Returns the list of categories as dicts."""
-        categories = self.cat_repo.get_all()
-        return [{"id": u.id, "categoria": u.categoria} for u in categories]
+        with session_scope() as db:
+            # Served from the process-wide cache (no query once loaded)
+            return [{"id": cat_id, "categoria": nome} for cat_id, nome in categorias_cache.all(db)]
 
     # ==========================
     # Reports / Metrics
@@ -286,17 +564,19 @@ class GestaoController:
             categoria (str, optional): Nome da categoria
             tipo (str, optional): Tipo da transação ('DEBT', 'PAYMENT', ou None para todos)
         """
-        return self.trans_repo.get_summary_metrics(
-            user_cpf=user_cpf,
-            data_inicial=data_inicial,
-            data_final=data_final,
-            categoria=categoria,
-            tipo=tipo
-        )
+        with session_scope() as db:
+            return RegistroRepository(db).get_summary_metrics(
+                user_cpf=user_cpf,
+                data_inicial=data_inicial,
+                data_final=data_final,
+                categoria=categoria,
+                tipo=tipo
+            )
     
-    def get_filtered_transactions(self, user_cpf=None, data_inicial=None, data_final=None, categoria=None, tipo=None):
+    def get_filtered_transactions(self, user_cpf=None, data_inicial=None, data_final=None, categoria=None, tipo=None,
+                                  offset=0, limit=PAGE_SIZE):
         """
-        Retorna transações filtradas por múltiplos critérios em formato de dicionário.
+        Retorna uma página de transações filtradas por múltiplos critérios em formato de dicionário.
         
         Args:
             user_cpf (str, optional): CPF do usuário
@@ -304,24 +584,59 @@ class GestaoController:
             data_final (date, optional): Data final do intervalo
             categoria (str, optional): Nome da categoria
             tipo (str, optional): Tipo da transação ('DEBT', 'PAYMENT', ou None para todos)
+            offset (int, optional): Deslocamento da página
+            limit (int, optional): Tamanho da página
         
         Returns:
-            list: Lista de dicionários com transações filtradas
+            tuple: (lista de dicionários da página, mais recentes primeiro; total encontrado)
         """
-        transactions = self.trans_repo.get_with_filters(
-            user_cpf=user_cpf,
-            data_inicial=data_inicial,
-            data_final=data_final,
-            categoria=categoria,
-            tipo=tipo
-        )
-        # Convert to dicts
-        results = [self._trans_to_dict(t) for t in transactions]
-        
-        # Sort by 'data' descending (YYYY-MM-DD string sort works)
-        results.sort(key=lambda x: x['data'], reverse=True)
-        
-        return results
+        with session_scope() as db:
+            transactions, total = RegistroRepository(db).get_with_filters(
+                user_cpf=user_cpf,
+                data_inicial=data_inicial,
+                data_final=data_final,
+                categoria=categoria,
+                tipo=tipo,
+                limit=limit,
+                offset=offset
+            )
+            # Convert to dicts
+            return [self._trans_to_dict(t) for t in transactions], total
+
+    # ==========================
+    # Period close (Fechamento)
+    # ==========================
+
+    def get_ultimo_fechamento(self):
+        """Returns the date of the last period close ('YYYY-MM-DD') or None."""
+        with session_scope() as db:
+            last = FechamentoRepository(db).get_last()
+            return last.data_fechamento.strftime("%Y-%m-%d") if last else None
+
+    def fechar_periodo(self, data_str):
+        """Closes the period up to the given date ('YYYY-MM-DD'); records up to it become read-only."""
+        try:
+            data_fechamento = datetime.strptime(data_str, "%Y-%m-%d").date()
+        except (ValueError, TypeError):
+            self.view.show_message("Data de fechamento inválida.", ft.Colors.RED)
+            return
+
+        try:
+            with session_scope() as db:
+                FechamentoRepository(db).fechar(data_fechamento)
+        except ValueError as e:
+            self.view.show_message(str(e), ft.Colors.RED)
+            return
+        self.view.show_message(f"Período fechado até {data_fechamento.strftime('%d/%m/%Y')}.", ft.Colors.GREEN)
+
+    def reabrir_periodo(self):
+        """Undoes the last period close."""
+        with session_scope() as db:
+            reaberto = FechamentoRepository(db).reabrir()
+        if reaberto:
+            self.view.show_message(f"Fechamento de {reaberto.strftime('%d/%m/%Y')} desfeito.", ft.Colors.GREEN)
+        else:
+            self.view.show_message("Nenhum período fechado.", ft.Colors.RED)
 
     # ==========================
     # Authentication
@@ -329,7 +644,6 @@ class GestaoController:
 
     def logout(self):
         """Handles user logout and navigation back to login."""
-        self.db.close() # Close connection
         from views.login_view import LoginView
         from controllers.login_controller import LoginController
         
@@ -343,6 +657,50 @@ class GestaoController:
         self.page.add(login_view)
         self.page.update()
         
-    def criar_recibo(self, nome, cpf, valor):
-        """Generates a receipt using the shared controller."""
-        return criar_recibo(nome, cpf, valor)
+    def criar_recibo(self, nome, cpf, valor, trans_id=None):
+        """Generates a receipt using the shared controller ('referente a' from the allocation ledger)."""
+        referente_a = self.describe_allocations(trans_id) if trans_id else None
+        return criar_recibo(nome, cpf, valor, referente_a)
+
+    def describe_allocations(self, trans_id):
+        """
+        Describes what a payment paid off (or which payments paid a debt), from the ledger.
+
+        Returns:
+            str: Text for the receipt, or None if the record no longer exists
+        """
+        def brl(value):
+            return f"R$ {value:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+        def day(value):
+            return value.strftime("%d/%m/%Y") if value else "data não informada"
+
+        with session_scope() as db:
+            repo = RegistroRepository(db)
+            found = repo.get_by_ids([trans_id])
+            if not found:
+                return None
+            trans = found[0]
+            categoria = trans.categoria_rel.categoria if trans.categoria_rel else "Sem Categoria"
+
+            if trans.type_id == 1:
+                items = repo.get_allocations_by_payment(trans.id)
+                if not items:
+                    return f"crédito de {categoria} ({brl(trans.valor)}), ainda sem dívida em aberto para abater."
+                parts = [
+                    f"{debt.categoria_rel.categoria} de {day(debt.data_debito)} ({brl(cents / 100)})"
+                    for debt, cents in items
+                ]
+                credit = to_cents(trans.valor) - sum(cents for _, cents in items)
+                if credit > 0:
+                    parts.append(f"crédito de {brl(credit / 100)}")
+                return "pagamento de " + "; ".join(parts) + "."
+
+            items = repo.get_allocations_by_debt(trans.id)
+            paid = sum(cents for _, cents in items) / 100
+            text = f"pagamento de {categoria} de {day(trans.data_debito)} ({brl(paid)} de {brl(trans.valor)})"
+            if items:
+                text += ", com as entradas de " + ", ".join(
+                    f"{day(payment.data_entrada)} ({brl(cents / 100)})" for payment, cents in items
+                )
+            return text + "."
@@ -1,6 +1,6 @@
 from time import sleep
 from models.dto_form_dados import DTO_FormDados
-from database.config import SessionLocal
+from database.config import session_scope
 from repositories.user_repository import UsuarioRepository
 
 class LoginController:
@@ -12,8 +12,6 @@ class LoginController:
         self.page = page
         self.view = None # Will be set after view initialization
         self.model = DTO_FormDados()
-        self.db = SessionLocal()
-        self.user_repo = UsuarioRepository(self.db)
 
     def set_view(self, view):
         """Sets the reference to the View."""
@@ -34,10 +32,12 @@ class LoginController:
         
         self.model.cpf = cpf
 
-        # Real DB Lookup
-        user = self.user_repo.get_by_cpf(cpf)
+        # Real DB Lookup (user fields are copied to the model, the session is not kept)
+        with session_scope() as db:
+            user = UsuarioRepository(db).get_by_cpf(cpf)
+            user_data = (user.id, user.nome, user.senha) if user else None
         
-        if not user:
+        if not user_data:
             # Case 1: CPF does not exist in DB
             # For this app flow, we might want to AUTO-REGISTER new users implicitly via flow?
             # Or show error? The requirement implied "Add User" is done inside Gestao.
@@ -45,12 +45,11 @@ class LoginController:
             self.view.show_message("CPF não cadastrado.", "red") # Using string "red" or import colors if needed.
             return
 
-        self.model.id = user.id
-        self.model.nome = user.nome
+        self.model.id, self.model.nome, senha = user_data
         
-        if user.senha:
+        if senha:
             # Case 2: CPF exists AND has password
-            self.model.senha = user.senha # Store hashed pass (or plain for now) to compare
+            self.model.senha = senha # Store hashed pass (or plain for now) to compare
             self.view.show_message(f"Olá {self.model.nome}. Insira sua senha", "green")
             self.view.enable_password_field()
         else:
@@ -88,7 +87,8 @@ class LoginController:
         """Handles the creation of a new password for a user without one."""
         if senha:
             # Update DB
-            self.user_repo.update(self.model.cpf, senha=senha)
+            with session_scope() as db:
+                UsuarioRepository(db).update(self.model.cpf, senha=senha)
             self.model.senha = senha
             
             self.view.show_message(f"Senha cadastrada com sucesso para {self.model.nome}", "green")
@@ -116,7 +116,6 @@ class LoginController:
             gestao_controller.set_view(gestao_view)
             self.page.add(gestao_view)
             self.page.update()
-            self.db.close()
             return
 
         # Navigate to Dashboard (User)
@@ -135,5 +134,4 @@ class LoginController:
         
         self.page.add(dashboard_view)
         self.page.update()
-        self.db.close()
 
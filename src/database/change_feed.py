@@ -0,0 +1,335 @@
+"""
+Feed de mudanças: os repositórios publicam, após o commit, eventos compactos das
+escritas e as sessões abertas (GestaoView/DashboardView) aplicam o delta na tela
+sem consultar o banco de novo.
+
+Mensagem publicada (um dict por commit):
+    {"registros": [evento_registro, ...], "usuarios": [evento_usuario, ...]}
+ou {"reload": True} quando a escrita é grande demais para ser descrita (importação).
+A chave opcional "invalidate" lista os caches de processo que a escrita deixou
+velhos ("categorias", "classificacoes", "usuarios"), e "session" identifica a
+sessão que escreveu (ver origin()): ela já atualizou a própria tela e ignora a
+mensagem.
+
+Os valores dos eventos são absolutos (saldo, totais do usuário), então aplicar a
+mesma mensagem duas vezes não muda nada.
+
+Entrega: num processo só, direto para os sinks (page.pubsub). Com Postgres
+(connect()), publish() vira NOTIFY e cada processo tem uma thread em LISTEN que
+invalida os caches locais e repassa a mensagem aos seus sinks; assim vários
+processos atrás de um balanceador veem as escritas uns dos outros.
+"""
+import contextvars
+import json
+import logging
+import os
+import select
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Topic of the Flet pubsub where the messages are delivered to every session
+TOPIC = "changes"
+
+# Postgres channel and NOTIFY payload budget (the server limit is 8000 bytes)
+PG_CHANNEL = "counts_changes"
+MAX_PAYLOAD = 7500
+
+# CHANGE_FEED_NOTIFY=0 keeps the feed in-process even on Postgres (single worker)
+CHANGE_FEED_NOTIFY = os.getenv("CHANGE_FEED_NOTIFY", "1") != "0"
+
+# Identifies this process in NOTIFY payloads (its own caches are already fresh)
+PROCESS_ID = uuid.uuid4().hex
+
+_lock = threading.Lock()
+_sinks = []
+_caches = {}
+_pubsub_attached = False
+_transport = None # None: in-process delivery; else callable(message) (NOTIFY)
+_listener = None # (thread, stop event, wake-up socket) of the LISTEN thread
+
+# Session whose writes are being published on this thread (see origin)
+_origin = contextvars.ContextVar("change_feed_origin", default=None)
+
+
+def add_sink(sink):
+    """Registers a callable(message) that receives every published message."""
+    with _lock:
+        _sinks.append(sink)
+
+
+def register_cache(name: str, invalidate):
+    """Registers a process cache that messages from other processes may invalidate."""
+    _caches[name] = invalidate
+
+
+@contextmanager
+def origin(session_id: str):
+    """Tags the messages published inside the block with the writing session ("session")."""
+    token = _origin.set(session_id)
+    try:
+        yield
+    finally:
+        _origin.reset(token)
+
+
+def publish(message):
+    """Publishes a message to every process (NOTIFY) or, without Postgres, to the local sinks."""
+    session_id = _origin.get()
+    if session_id is not None:
+        message = dict(message, session=session_id)
+    if _transport:
+        try:
+            _transport(message)
+            return
+        except Exception as e:
+            # At least this process still sees its own write
+            logger.warning("Erro ao enviar NOTIFY, entregando só localmente: %s", e)
+    _deliver(message)
+
+
+def _deliver(message):
+    """Delivers a message to every local sink (errors in one sink do not stop the others)."""
+    for sink in list(_sinks):
+        try:
+            sink(message)
+        except Exception:
+            logger.exception("Erro ao publicar mudança")
+
+
+def attach_pubsub(pubsub):
+    """
+    Bridges the feed to Flet's pubsub (once per process).
+
+    The PubSubHub behind page.pubsub is shared by every session of the app, so the
+    client of the first session is enough to reach all of them.
+    """
+    global _pubsub_attached
+    with _lock:
+        if _pubsub_attached:
+            return
+        _pubsub_attached = True
+        _sinks.append(lambda message: pubsub.send_all_on_topic(TOPIC, message))
+
+
+def subscribe(page, handler):
+    """Subscribes a session's handler(topic, message) to the messages (see attach_pubsub)."""
+    page.pubsub.subscribe_topic(TOPIC, handler)
+
+
+def unsubscribe(page):
+    """Stops delivering the messages to a session (its view is going away)."""
+    page.pubsub.unsubscribe_topic(TOPIC)
+
+
+# ==========================
+# Postgres LISTEN/NOTIFY
+# ==========================
+
+def connect(engine, listen: bool = True):
+    """
+    Routes the feed through Postgres NOTIFY (no-op on other databases).
+
+    listen=False only sends (scripts that write but have no screens to update).
+    Call once per process, after init_database().
+    """
+    global _transport, _listener
+    if engine.dialect.name != "postgresql" or not CHANGE_FEED_NOTIFY:
+        return False
+    with _lock:
+        _transport = lambda message: _notify(engine, message)
+        if listen and _listener is None:
+            stop = threading.Event()
+            wake, wake_listener = socket.socketpair()
+            thread = threading.Thread(
+                target=_listen, args=(engine, stop, wake_listener), name="change-feed-listener", daemon=True
+            )
+            _listener = (thread, stop, wake)
+            thread.start()
+    return True
+
+
+def disconnect(timeout: float = 5):
+    """
+    Stops the LISTEN thread (closing its connection) and goes back to in-process delivery.
+
+    Call on shutdown, before disposing of the engine. No-op if connect() did nothing.
+    """
+    global _transport, _listener
+    with _lock:
+        listener, _listener = _listener, None
+        _transport = None
+    if listener is None:
+        return
+    thread, stop, wake = listener
+    stop.set()
+    try:
+        wake.send(b"x") # Wakes up the select() right away
+    except OSError:
+        pass
+    thread.join(timeout)
+    wake.close()
+
+
+def _chunks(message):
+    """
+    Splits a message into NOTIFY payloads under MAX_PAYLOAD bytes.
+
+    Events carry absolute values, so each chunk is a self-contained message. The
+    rest of the head (reload, invalidate) goes in the first chunk only; "session"
+    goes in every chunk, so the writing session skips all of them.
+    """
+    head = {k: v for k, v in message.items() if k not in ("registros", "usuarios")}
+    tag = {k: v for k, v in head.items() if k == "session"}
+    chunk, size = dict(head), len(json.dumps(head))
+    for key in ("registros", "usuarios"):
+        for event in message.get(key, []):
+            event_size = len(json.dumps(event)) + 16
+            if size + event_size > MAX_PAYLOAD and (chunk.get("registros") or chunk.get("usuarios")):
+                yield chunk
+                chunk, size = dict(tag), len(json.dumps(tag))
+            chunk.setdefault(key, []).append(event)
+            size += event_size
+    yield chunk
+
+
+def _notify(engine, message):
+    from sqlalchemy import text
+
+    with engine.connect() as conn:
+        for chunk in _chunks(message):
+            payload = json.dumps({"origin": PROCESS_ID, "message": chunk}, separators=(",", ":"))
+            conn.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": PG_CHANNEL, "payload": payload})
+        conn.commit()
+
+
+def _on_notify(payload: str):
+    """Handles one NOTIFY: invalidates stale caches, then delivers to the local sinks."""
+    envelope = json.loads(payload)
+    message = envelope["message"]
+    if envelope.get("origin") != PROCESS_ID:
+        names = _caches.keys() if message.get("reload") else message.get("invalidate", [])
+        for name in names:
+            if name in _caches:
+                _caches[name]()
+    _deliver(message)
+
+
+def _listen(engine, stop, wake):
+    """
+    Listener thread: a dedicated connection in LISTEN (outside the pool).
+
+    On a lost connection it reconnects with backoff; notifications sent meanwhile
+    are lost, so after reconnecting the caches are dropped and the screens reload.
+    Runs until `stop` is set (disconnect), which also writes to `wake`.
+    """
+    backoff = 1
+    reconnect = False
+    while not stop.is_set():
+        raw = None
+        try:
+            raw = engine.raw_connection()
+            raw.detach() # Long-lived: never handed back to the pool
+            conn = raw.driver_connection
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {PG_CHANNEL}")
+            if reconnect:
+                _on_notify(json.dumps({"origin": None, "message": {"reload": True}}))
+            backoff, reconnect = 1, True
+
+            while not stop.is_set():
+                # Wakes up now and then even when idle, so a dead connection is noticed
+                select.select([conn, wake], [], [], 30)
+                if stop.is_set():
+                    break
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    try:
+                        _on_notify(notify.payload)
+                    except Exception:
+                        logger.exception("Erro ao aplicar NOTIFY")
+        except Exception as e:
+            if stop.is_set():
+                break
+            logger.warning("Conexão LISTEN perdida (%s); reconectando em %ss", e, backoff)
+            stop.wait(backoff)
+            backoff = min(backoff * 2, 60)
+        finally:
+            if raw is not None:
+                try:
+                    raw.close()
+                except Exception:
+                    pass
+    wake.close()
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+def registro_event(registro, deleted: bool = False, created: bool = False):
+    """Compact event of a Registro (read its attributes before the commit expires them)."""
+    return {
+        "id": registro.id,
+        "user_id": registro.user_id,
+        "category_id": registro.category_id,
+        "type_id": registro.type_id,
+        "valor": registro.valor,
+        "saldo": registro.saldo,
+        "classificacao_id": registro.classificacao_id,
+        "data_debito": _iso(registro.data_debito),
+        "data_entrada": _iso(registro.data_entrada),
+        "data_prevista": _iso(registro.data_prevista),
+        "creado_em": _iso(registro.creado_em),
+        "created": created,
+        "deleted": deleted,
+    }
+
+
+def usuario_event(user_id: int, cpf: str = None, nome: str = None, balance: dict = None,
+                  created: bool = False, deleted: bool = False):
+    """Compact event of a user: identity changes and/or new balance totals."""
+    event = {"id": user_id, "created": created, "deleted": deleted}
+    if cpf is not None:
+        event["cpf"] = cpf
+    if nome is not None:
+        event["nome"] = nome
+    if balance is not None:
+        event["balance"] = balance
+    return event
+
+
+if __name__ == "__main__":
+    # Round trip against the configured Postgres (DATABASE_URL):
+    #   cd src && python -m database.change_feed
+    from database.config import engine
+
+    received = []
+    done = threading.Event()
+
+    def _sink(message):
+        received.append(message)
+        if message.get("marker"):
+            done.set()
+
+    add_sink(_sink)
+    if not connect(engine):
+        raise SystemExit("Change feed: DATABASE_URL não é Postgres (ou CHANGE_FEED_NOTIFY=0)")
+    time.sleep(1) # Let the listener issue LISTEN
+
+    big = {"registros": [{"id": i, "pad": "x" * 200} for i in range(200)], "usuarios": [{"id": 1, "deleted": False}]}
+    publish(big)
+    publish({"marker": True})
+    if not done.wait(10):
+        raise SystemExit("Change feed: nenhum NOTIFY recebido em 10s")
+
+    chunks = [m for m in received if not m.get("marker")]
+    ids = [e["id"] for m in chunks for e in m.get("registros", [])]
+    assert ids == list(range(200)), "eventos perdidos ou fora de ordem"
+    print(f"OK: {len(ids)} eventos em {len(chunks)} NOTIFY(s)")
@@ -0,0 +1,28 @@
+from database.config import engine as app_engine
+
+def run_migrations(engine=None):
+    """
+    Aplica mudanças de schema que o create_all não faz em bancos já existentes.
+
+    O create_all só cria índices junto com tabelas novas; aqui os índices declarados
+    nos modelos são criados (se ainda não existirem) nas tabelas já em uso, e o
+    ledger de alocações (tabela nova) é preenchido a partir dos registros existentes.
+    Idempotente: pode rodar a cada startup.
+    """
+    from sqlalchemy.orm import Session
+    from database.models import Registro, Alocacao
+    from repositories.transaction_repository import RegistroRepository
+
+    engine = engine or app_engine
+    for table in (Registro.__table__, Alocacao.__table__):
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+    with Session(engine) as db:
+        if db.query(Alocacao.id).first() is None and db.query(Registro.id).filter(Registro.type_id == 1).first():
+            print("🌱 Preenchendo o ledger de alocações...")
+            print(f"✅ {RegistroRepository(db).rebuild_ledger()} alocações gravadas")
+
+if __name__ == "__main__":
+    run_migrations()
+    print("Migrações aplicadas.")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, Date, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Float, Boolean, Date, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .config import Base
@@ -87,7 +87,113 @@ class Registro(Base):
     # classification relationship
     classificacao_rel = relationship("Classificacao")
 
+    # Indexes for the hot access patterns (created on existing databases by database.migrations)
+    __table_args__ = (
+        # FIFO recalculation per (user, category): debts by data_debito, payments by type
+        Index("ix_registros_user_cat_type_debito", user_id, category_id, type_id, data_debito),
+        # Payments of a (user, category) in payment order (allocation ledger)
+        Index("ix_registros_user_cat_type_entrada", user_id, category_id, type_id, data_entrada),
+        # Open debts (watermark of the incremental FIFO, member dashboard)
+        Index(
+            "ix_registros_debitos_abertos", user_id, category_id, data_debito,
+            postgresql_where=(type_id == 0) & (classificacao_id != 3),
+            sqlite_where=(type_id == 0) & (classificacao_id != 3)
+        ),
+        # Reports: date ranges per type
+        Index("ix_registros_type_debito", type_id, data_debito),
+        Index("ix_registros_type_entrada", type_id, data_entrada),
+        # Paged listings of Dívidas/Entradas (ordered by id)
+        Index("ix_registros_type_id", type_id, id),
+    )
+
     def __repr__(self):
         return f"<Registro(id={self.id}, valor={self.valor}, categoria={self.categoria_rel.categoria}, type_id={self.type_id})>"
 
-        
\ No newline at end of file
+        
+class Alocacao(Base):
+    """
+    Ledger de abatimento: quanto (em centavos) de cada pagamento quitou cada dívida.
+
+    Os recálculos não alteram linhas gravadas: quando a distribuição muda, linhas
+    de ajuste (com a diferença, possivelmente negativa) são acrescentadas, então o
+    valor de um par é a soma das suas linhas. Linhas só são apagadas quando um dos
+    registros do par é excluído (delete_allocations) e quando o ledger inteiro é
+    recriado a partir dos registros (rebuild_ledger).
+    """
+    __tablename__ = "alocacoes"
+
+    id = Column(Integer, primary_key=True)
+    payment_id = Column(Integer, ForeignKey("registros.id", ondelete="CASCADE"), nullable=False)
+    debt_id = Column(Integer, ForeignKey("registros.id", ondelete="CASCADE"), nullable=False)
+    valor_centavos = Column(Integer, nullable=False)
+    creado_em = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # What a payment covered (receipts) / what paid a debt (statements)
+        Index("ix_alocacoes_payment_debt", payment_id, debt_id),
+        Index("ix_alocacoes_debt_payment", debt_id, payment_id),
+    )
+
+    def __repr__(self):
+        return f"<Alocacao(payment_id={self.payment_id}, debt_id={self.debt_id}, valor_centavos={self.valor_centavos})>"
+
+
+class Fechamento(Base):
+    """
+    Fechamento de período: registros com data até data_fechamento ficam travados.
+
+    Guarda, por (usuário, categoria), o ponto de partida do abatimento FIFO nessa
+    data (SaldoFechamento e PendenciaFechamento), de modo que os recálculos só
+    leem o que veio depois do último fechamento.
+    """
+    __tablename__ = "fechamentos"
+
+    id = Column(Integer, primary_key=True)
+    data_fechamento = Column(Date, nullable=False, unique=True)
+    creado_em = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<Fechamento(data_fechamento={self.data_fechamento})>"
+
+
+class SaldoFechamento(Base):
+    """Totais de um (usuário, categoria) até a data do fechamento (balanço dos usuários)."""
+    __tablename__ = "saldos_fechamento"
+
+    id = Column(Integer, primary_key=True)
+    fechamento_id = Column(Integer, ForeignKey("fechamentos.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(Integer, ForeignKey("usuarios.id", ondelete="CASCADE"), nullable=False)
+    category_id = Column(Integer, ForeignKey("categorias.id"), nullable=False)
+    total_dividas_centavos = Column(Integer, nullable=False, default=0)
+    total_entradas_centavos = Column(Integer, nullable=False, default=0)
+    maior_entrada_centavos = Column(Integer, nullable=True)
+
+    __table_args__ = (
+        Index("ix_saldos_fechamento_partition", fechamento_id, user_id, category_id, unique=True),
+    )
+
+    def __repr__(self):
+        return f"<SaldoFechamento(fechamento_id={self.fechamento_id}, user_id={self.user_id}, category_id={self.category_id})>"
+
+
+class PendenciaFechamento(Base):
+    """
+    O que ficou em aberto na data do fechamento: o saldo de cada dívida não quitada
+    e o crédito ainda não alocado de cada pagamento, em centavos.
+    """
+    __tablename__ = "pendencias_fechamento"
+
+    id = Column(Integer, primary_key=True)
+    fechamento_id = Column(Integer, ForeignKey("fechamentos.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(Integer, ForeignKey("usuarios.id", ondelete="CASCADE"), nullable=False)
+    category_id = Column(Integer, ForeignKey("categorias.id"), nullable=False)
+    registro_id = Column(Integer, ForeignKey("registros.id", ondelete="CASCADE"), nullable=False)
+    valor_centavos = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("ix_pendencias_fechamento_partition", fechamento_id, user_id, category_id),
+        Index("ix_pendencias_fechamento_registro", registro_id, fechamento_id),
+    )
+
+    def __repr__(self):
+        return f"<PendenciaFechamento(registro_id={self.registro_id}, valor_centavos={self.valor_centavos})>"
@@ -1,21 +1,20 @@
 import flet as ft
 from views.login_view import LoginView
 from controllers.login_controller import LoginController
-from database.config import engine, Base, seed_basic_data
+from controllers.gestao_controller import UPLOAD_DIR
+from database.config import init_database, configure_logging, engine
+from database import change_feed
 
 def main(page:ft.Page):
     """
-    Main entry point for the application.
-    Initializes the LoginView and Controller.
+    Main entry point for each session (browser connection).
+    Initializes the LoginView and Controller. Schema/seed run once at startup.
     """
-    # Create Tables (if they don't exist)
-    Base.metadata.create_all(bind=engine)
-    
-    # Seed basic data (categories, classifications, admin user)
-    seed_basic_data()
-
     page.title = "Sistema Counts2"
     page.theme_mode = ft.ThemeMode.LIGHT
+
+    # Writes are broadcast to every open session (the pubsub hub is process-wide)
+    change_feed.attach_pubsub(page.pubsub)
     
     # Initialize Controller
     controller = LoginController(page)
@@ -35,6 +34,13 @@ if __name__ == "__main__":
     # No Render, usar a porta fornecida pela variável PORT
     # Em desenvolvimento local, usar 8400 como padrão
     port = int(os.getenv("PORT", 8400))
+
+    configure_logging()
+
+    # Create Tables and seed basic data once per process, before accepting sessions
+    init_database()
+    # On Postgres, writes reach the other app processes through LISTEN/NOTIFY
+    change_feed.connect(engine)
     
     # Para deploy web, usar FLET_APP_WEB ao invés de WEB_BROWSER
     # host="0.0.0.0" permite aceitar conexões de qualquer origem (necessário no Render)
@@ -42,5 +48,7 @@ if __name__ == "__main__":
         target=main,
         view=ft.AppView.FLET_APP_WEB,
         port=port,
-        host="0.0.0.0"
+        host="0.0.0.0",
+        upload_dir=UPLOAD_DIR # Imports (CSV/XLSX) uploaded from the browser; requires FLET_SECRET_KEY
     )
+    change_feed.disconnect()
@@ -0,0 +1,11 @@
+from dataclasses import dataclass, field
+
+@dataclass
+class ChangeSet:
+    """Registros e usuários afetados por uma escrita (a view atualiza só esses cards)."""
+    record_ids: set = field(default_factory=set)
+    new_record_ids: set = field(default_factory=set)
+    removed_record_ids: set = field(default_factory=set)
+    user_ids: set = field(default_factory=set)
+    new_user_ids: set = field(default_factory=set)
+    removed_user_ids: set = field(default_factory=set)
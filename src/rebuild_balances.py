@@ -0,0 +1,171 @@
+"""
+Recalcula saldo/classificação de todas as dívidas de uma vez (UPDATE set-based).
+
+Use depois de correções manuais no banco ou de importações feitas por fora do app:
+
+    cd src && python rebuild_balances.py            # recalcula
+    cd src && python rebuild_balances.py --verify   # recalcula e confere com o motor Python
+
+O ledger de alocações (pagamento -> dívida) e os checkpoints dos fechamentos
+(SaldoFechamento/PendenciaFechamento) também são recriados a partir dos registros;
+sem isso uma correção num período fechado seria desfeita pela próxima escrita, que
+recalcula a partir do checkpoint.
+
+--verify refaz o abatimento FIFO de cada (usuário, categoria) em memória com
+balance_engine.replay/allocations (as mesmas regras de _recalculate_balances) e
+lista as dívidas, alocações e checkpoints que ficaram diferentes no banco.
+"""
+import argparse
+import time
+from itertools import groupby
+from sqlalchemy import func, case
+from database.config import engine, session_scope
+from database.models import Registro, Alocacao, Fechamento, SaldoFechamento, PendenciaFechamento
+from database import change_feed
+from repositories import balance_engine
+from repositories.balance_engine import to_cents
+from repositories.fechamento_repository import FechamentoRepository
+from repositories.transaction_repository import RegistroRepository
+
+
+def expected_state(db):
+    """
+    Reference FIFO in Python.
+
+    Returns:
+        tuple: ({debt_id: (saldo, classificacao_id)}, {(payment_id, debt_id): centavos})
+    """
+    repo = RegistroRepository(db)
+    rows = db.query(
+        Registro.id, Registro.user_id, Registro.category_id, Registro.type_id, Registro.valor
+    ).order_by(Registro.user_id, Registro.category_id, *repo._partition_order()).all()
+
+    balances, ledger = {}, {}
+    for _, partition in groupby(rows, key=lambda r: (r.user_id, r.category_id)):
+        partition = list(partition)
+        debts = [(r.id, r.valor) for r in partition if r.type_id == 0]
+        payments = [(r.id, to_cents(r.valor)) for r in partition if r.type_id == 1]
+        balances.update(balance_engine.replay(debts, sum(cents for _, cents in payments)))
+        for payment_id, debt_id, cents in balance_engine.allocations(
+            [(debt_id, to_cents(valor)) for debt_id, valor in debts], payments
+        ):
+            ledger[(payment_id, debt_id)] = cents
+    return balances, ledger
+
+
+def expected_checkpoints(db):
+    """
+    Reference checkpoints: for every close, the FIFO of the records dated up to it.
+
+    Returns:
+        tuple: ({(fechamento_id, user_id, category_id): (dívidas, entradas, maior entrada)},
+                {(fechamento_id, registro_id): centavos em aberto})
+    """
+    repo = RegistroRepository(db)
+    rows = db.query(
+        Registro.id, Registro.user_id, Registro.category_id, Registro.type_id, Registro.valor,
+        case((Registro.type_id == 0, Registro.data_debito), else_=Registro.data_entrada).label("data")
+    ).order_by(Registro.user_id, Registro.category_id, *repo._partition_order()).all()
+    partitions = [(key, list(partition)) for key, partition in groupby(rows, key=lambda r: (r.user_id, r.category_id))]
+
+    totals, pendencias = {}, {}
+    for fechamento_id, data_fechamento in db.query(Fechamento.id, Fechamento.data_fechamento):
+        for key, partition in partitions:
+            closed = [r for r in partition if r.data is not None and r.data <= data_fechamento]
+            if not closed:
+                continue
+            debts = [(r.id, to_cents(r.valor)) for r in closed if r.type_id == 0]
+            payments = [(r.id, to_cents(r.valor)) for r in closed if r.type_id == 1]
+            totals[(fechamento_id, *key)] = (
+                sum(cents for _, cents in debts),
+                sum(cents for _, cents in payments),
+                max((cents for _, cents in payments), default=None),
+            )
+            for registro_id, cents in balance_engine.open_items(debts, payments):
+                pendencias[(fechamento_id, registro_id)] = cents
+    return totals, pendencias
+
+
+def verify(db):
+    """Compares the database (balances and ledger) with the reference; returns [(what, got, expected)]."""
+    balances, ledger = expected_state(db)
+    actual = db.query(Registro.id, Registro.saldo, Registro.classificacao_id).filter(Registro.type_id == 0).all()
+    # Balances in cents, like rebuild_balances (a NULL saldo is never right)
+    mismatches = [
+        (f"dívida {debt_id}", (saldo, classificacao_id), balances[debt_id])
+        for debt_id, saldo, classificacao_id in actual
+        if (None if saldo is None else to_cents(saldo), classificacao_id)
+        != (to_cents(balances[debt_id][0]), balances[debt_id][1])
+    ]
+
+    stored = {
+        (payment_id, debt_id): cents
+        for payment_id, debt_id, cents in db.query(
+            Alocacao.payment_id, Alocacao.debt_id, func.sum(Alocacao.valor_centavos)
+        ).group_by(Alocacao.payment_id, Alocacao.debt_id)
+        if cents
+    }
+    mismatches.extend(
+        (f"alocação {payment_id}->{debt_id}", stored.get((payment_id, debt_id)), ledger.get((payment_id, debt_id)))
+        for payment_id, debt_id in sorted(stored.keys() | ledger.keys())
+        if stored.get((payment_id, debt_id)) != ledger.get((payment_id, debt_id))
+    )
+
+    totals, pendencias = expected_checkpoints(db)
+    stored_totals = {
+        (row.fechamento_id, row.user_id, row.category_id):
+            (row.total_dividas_centavos, row.total_entradas_centavos, row.maior_entrada_centavos)
+        for row in db.query(SaldoFechamento)
+    }
+    stored_pendencias = dict(
+        ((fechamento_id, registro_id), cents)
+        for fechamento_id, registro_id, cents in db.query(
+            PendenciaFechamento.fechamento_id, PendenciaFechamento.registro_id, PendenciaFechamento.valor_centavos
+        )
+    )
+    for what, got, want in (
+        ("totais do fechamento", stored_totals, totals),
+        ("pendência do fechamento", stored_pendencias, pendencias),
+    ):
+        mismatches.extend(
+            (f"{what} {key}", got.get(key), want.get(key))
+            for key in sorted(got.keys() | want.keys())
+            if got.get(key) != want.get(key)
+        )
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recalcula o abatimento FIFO de todas as dívidas.")
+    parser.add_argument("--verify", action="store_true", help="confere o resultado com o motor Python")
+    args = parser.parse_args()
+
+    # Open screens (other processes) reload after the rebuild
+    change_feed.connect(engine, listen=False)
+
+    with session_scope() as db:
+        repo = RegistroRepository(db)
+        start = time.perf_counter()
+        updated = repo.rebuild_balances()
+        print(f"✅ {updated} dívidas atualizadas em {time.perf_counter() - start:.2f}s")
+
+        start = time.perf_counter()
+        allocations = repo.rebuild_ledger()
+        print(f"✅ Ledger recriado: {allocations} alocações em {time.perf_counter() - start:.2f}s")
+
+        start = time.perf_counter()
+        closes = FechamentoRepository(db).rebuild_checkpoints()
+        db.commit()
+        print(f"✅ Checkpoints de {closes} fechamento(s) recriados em {time.perf_counter() - start:.2f}s")
+
+        if args.verify:
+            mismatches = verify(db)
+            for what, got, want in mismatches[:20]:
+                print(f"❌ {what}: banco {got} != esperado {want}")
+            if mismatches:
+                raise SystemExit(f"{len(mismatches)} divergências com o motor Python")
+            print("✅ Conferido com o motor Python: nenhuma divergência")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Motor de abatimento FIFO (dívidas x pagamentos) de um par (usuário, categoria).
+
+Os valores são tratados em centavos inteiros, de modo que despejar o total de
+pagamentos de uma vez (replay completo) ou em parcelas (incremental) produz
+exatamente o mesmo saldo/classificação em cada dívida.
+"""
+
+# IDs da tabela classificacoes (ver seed_basic_data)
+PENDENTE = 1
+VENCIDO = 2
+PAGO = 3
+PARCIAL = 4
+
+
+def to_cents(valor) -> int:
+    """Converte um valor em reais (float) para centavos inteiros."""
+    return int(round((valor or 0.0) * 100))
+
+
+def from_cents(cents: int) -> float:
+    """Converte centavos inteiros para reais (float)."""
+    return cents / 100
+
+
+def allocate(debts, pool: int):
+    """
+    Aplica `pool` centavos às dívidas em ordem FIFO.
+
+    Args:
+        debts (list): [(chave, centavos_em_aberto)] já ordenadas por data_debito
+        pool (int): Centavos disponíveis para abater
+
+    Returns:
+        tuple: ([(chave, saldo_centavos, classificacao_id)] das dívidas atingidas,
+                centavos que sobraram)
+    """
+    updates = []
+    for key, open_cents in debts:
+        if pool <= 0:
+            break
+
+        if pool >= open_cents:
+            # Quita a dívida
+            pool -= open_cents
+            updates.append((key, 0, PAGO))
+        else:
+            # Abate parcialmente
+            updates.append((key, open_cents - pool, PARCIAL))
+            pool = 0
+    return updates, pool
+
+
+def replay(debts, pool: int):
+    """
+    Replay completo de um par (usuário, categoria), como _recalculate_balances.
+
+    Args:
+        debts (list): [(chave, valor)] em reais, já ordenadas por data_debito
+        pool (int): Total de pagamentos do par, em centavos
+
+    Returns:
+        dict: {chave: (saldo, classificacao_id)} de todas as dívidas
+    """
+    expected = {key: (valor, PENDENTE) for key, valor in debts}
+    updates, _ = allocate([(key, to_cents(valor)) for key, valor in debts], pool)
+    for key, saldo_cents, classificacao_id in updates:
+        expected[key] = (from_cents(saldo_cents), classificacao_id)
+    return expected
+
+
+def allocations(debts, payments):
+    """
+    Distribui cada pagamento, na ordem dos pagamentos, às dívidas em ordem FIFO.
+
+    É o mesmo abatimento de allocate (o total alocado a cada dívida coincide),
+    só que atribuído pagamento a pagamento.
+
+    Args:
+        debts (list): [(chave, centavos)] já ordenadas por data_debito
+        payments (list): [(chave, centavos)] já ordenados por data_entrada
+
+    Returns:
+        list: [(chave_pagamento, chave_divida, centavos)] com centavos > 0
+    """
+    result = []
+    queue = [[key, cents] for key, cents in debts if cents > 0]
+    position = 0
+    for payment_key, cents in payments:
+        while cents > 0 and position < len(queue):
+            debt = queue[position]
+            taken = min(cents, debt[1])
+            result.append((payment_key, debt[0], taken))
+            cents -= taken
+            debt[1] -= taken
+            if debt[1] == 0:
+                position += 1
+    return result
+
+
+def open_items(debts, payments):
+    """
+    O que fica em aberto depois do abatimento (o checkpoint de um fechamento).
+
+    Args:
+        debts (list): [(chave, centavos)] já ordenadas por data_debito
+        payments (list): [(chave, centavos)] já ordenados por data_entrada
+
+    Returns:
+        list: [(chave, centavos)] — o saldo das dívidas não quitadas, em ordem FIFO,
+            seguido do crédito não alocado de cada pagamento
+    """
+    allocated = {}
+    for payment_key, _, cents in allocations(debts, payments):
+        allocated[payment_key] = allocated.get(payment_key, 0) + cents
+    updates, _ = allocate(debts, sum(cents for _, cents in payments))
+    reached = {key: (saldo_cents, classificacao_id) for key, saldo_cents, classificacao_id in updates}
+    return [
+        (key, reached[key][0] if key in reached else cents)
+        for key, cents in debts
+        if reached.get(key, (None, None))[1] != PAGO
+    ] + [
+        (key, cents - allocated.get(key, 0))
+        for key, cents in payments
+        if cents > allocated.get(key, 0)
+    ]
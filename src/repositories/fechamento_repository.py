@@ -0,0 +1,208 @@
+from collections import defaultdict
+from datetime import date
+from itertools import groupby
+from sqlalchemy import func, case, insert, text, BigInteger
+from sqlalchemy.orm import Session
+from database.models import Registro, Fechamento, SaldoFechamento, PendenciaFechamento
+from repositories import balance_engine
+from repositories.balance_engine import to_cents
+from repositories.transaction_repository import RegistroRepository, BULK_BATCH_SIZE
+
+
+class FechamentoRepository:
+    """
+    Fechamento de período (mensal).
+
+    Fechar em uma data grava, para cada (usuário, categoria), o ponto de partida do
+    abatimento FIFO naquela data: os totais (SaldoFechamento) e o que ficou em
+    aberto (PendenciaFechamento: saldo das dívidas não quitadas e crédito não
+    alocado dos pagamentos). Registros com data até o fechamento ficam travados
+    (RegistroRepository levanta PeriodoFechadoError), e os recálculos passam a ler
+    só o checkpoint mais o que veio depois.
+    """
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_last(self):
+        """Último fechamento (ou None)."""
+        return self.db.query(Fechamento).order_by(Fechamento.data_fechamento.desc()).first()
+
+    def fechar(self, data_fechamento: date):
+        """
+        Fecha o período até data_fechamento (inclusive), a partir do fechamento anterior.
+
+        Returns:
+            Fechamento: O fechamento criado
+
+        Raises:
+            ValueError: Data no futuro ou não posterior ao último fechamento
+        """
+        last = self.get_last()
+        if data_fechamento >= date.today():
+            raise ValueError("Só é possível fechar períodos já encerrados (data anterior a hoje).")
+        if last and data_fechamento <= last.data_fechamento:
+            raise ValueError(f"Já existe fechamento até {last.data_fechamento.strftime('%d/%m/%Y')}.")
+
+        if self.db.get_bind().dialect.name == "postgresql":
+            # Writers wait until the checkpoint is committed (and then see the close)
+            self.db.execute(text("LOCK TABLE registros IN SHARE MODE"))
+
+        fechamento = Fechamento(data_fechamento=data_fechamento)
+        self.db.add(fechamento)
+        self.db.flush()
+        self._write_checkpoint(fechamento, last)
+        self.db.commit()
+        return fechamento
+
+    def rebuild_checkpoints(self):
+        """
+        Recria os checkpoints (SaldoFechamento/PendenciaFechamento) de todos os
+        fechamentos, em ordem, a partir dos registros. Não faz commit.
+
+        Necessário depois de correções feitas direto no banco em registros de um
+        período fechado (rebuild_balances.py, check_balances.py --repair): os
+        recálculos partem do checkpoint e desfariam a correção na próxima escrita.
+
+        Returns:
+            int: Número de fechamentos refeitos
+        """
+        if self.db.get_bind().dialect.name == "postgresql":
+            # As in fechar: no write runs its recompute from a half-rebuilt checkpoint
+            self.db.execute(text("LOCK TABLE registros IN SHARE MODE"))
+
+        for model in (PendenciaFechamento, SaldoFechamento):
+            self.db.query(model).delete(synchronize_session=False)
+        closes = self.db.query(Fechamento).order_by(Fechamento.data_fechamento).all()
+        last = None
+        for fechamento in closes:
+            self._write_checkpoint(fechamento, last)
+            last = fechamento
+        return len(closes)
+
+    def _write_checkpoint(self, fechamento, last):
+        """Writes the checkpoint rows of fechamento, from the previous close (last) plus the period."""
+        totals, opening = self._previous_checkpoint(last)
+        data_fechamento = fechamento.data_fechamento
+        # Start from the previous checkpoint, pour the period in
+        pendencias = [
+            {"fechamento_id": fechamento.id, "user_id": user_id, "category_id": category_id,
+             "registro_id": registro_id, "valor_centavos": cents}
+            for (user_id, category_id), debts, payments in self._period_partitions(last, data_fechamento, opening)
+            for registro_id, cents in balance_engine.open_items(debts, payments)
+        ]
+        saldos = [
+            {"fechamento_id": fechamento.id, "user_id": user_id, "category_id": category_id,
+             "total_dividas_centavos": dividas, "total_entradas_centavos": entradas, "maior_entrada_centavos": maior}
+            for (user_id, category_id), (dividas, entradas, maior)
+            in self._period_totals(last, data_fechamento, totals).items()
+        ]
+
+        for model, rows in ((SaldoFechamento, saldos), (PendenciaFechamento, pendencias)):
+            for start in range(0, len(rows), BULK_BATCH_SIZE):
+                self.db.execute(insert(model), rows[start:start + BULK_BATCH_SIZE])
+
+    def reabrir(self):
+        """
+        Desfaz o último fechamento (o período volta a aceitar alterações).
+
+        Returns:
+            date: Data do fechamento desfeito, ou None se não havia fechamento
+        """
+        last = self.get_last()
+        if not last:
+            return None
+        for model in (PendenciaFechamento, SaldoFechamento):
+            self.db.query(model).filter(model.fechamento_id == last.id).delete(synchronize_session=False)
+        self.db.delete(last)
+        self.db.commit()
+        return last.data_fechamento
+
+    def delete_user(self, user_id: int):
+        """
+        Removes a user's checkpoint rows (the user is being deleted; not committed).
+
+        UsuarioRepository.delete refuses users with records in a closed period, so
+        this only clears rows that no longer match any record.
+        """
+        for model in (PendenciaFechamento, SaldoFechamento):
+            self.db.query(model).filter(model.user_id == user_id).delete(synchronize_session=False)
+
+    def _previous_checkpoint(self, last):
+        """
+        Returns:
+            tuple: ({(user_id, category_id): (dívidas, entradas, maior entrada)} em centavos,
+                    {(user_id, category_id): ([(debt_id, centavos)], [(payment_id, centavos)])}
+                    com as pendências em ordem FIFO / de pagamento)
+        """
+        totals, opening = {}, defaultdict(lambda: ([], []))
+        if not last:
+            return totals, opening
+
+        for row in self.db.query(SaldoFechamento).filter(SaldoFechamento.fechamento_id == last.id):
+            totals[(row.user_id, row.category_id)] = (
+                row.total_dividas_centavos, row.total_entradas_centavos, row.maior_entrada_centavos
+            )
+
+        repo = RegistroRepository(self.db)
+        rows = self.db.query(
+            PendenciaFechamento.user_id, PendenciaFechamento.category_id, PendenciaFechamento.registro_id,
+            PendenciaFechamento.valor_centavos, Registro.type_id
+        ).join(Registro, Registro.id == PendenciaFechamento.registro_id).filter(
+            PendenciaFechamento.fechamento_id == last.id
+        ).order_by(*repo._partition_order())
+        for user_id, category_id, registro_id, cents, type_id in rows:
+            opening[(user_id, category_id)][type_id].append((registro_id, cents))
+        return totals, opening
+
+    def _in_period(self, last, data_fechamento: date, column):
+        """Rows dated in (last close, data_fechamento]."""
+        condition = column <= data_fechamento
+        if last:
+            condition = condition & (column > last.data_fechamento)
+        return condition
+
+    def _period_partitions(self, last, data_fechamento: date, opening):
+        """
+        Yields ((user_id, category_id), debts, payments) for every partition with
+        activity in the period or open items in the previous checkpoint: the previous
+        open items first, then the period's records, in FIFO / payment order.
+        """
+        repo = RegistroRepository(self.db)
+        data_registro = case((Registro.type_id == 0, Registro.data_debito), else_=Registro.data_entrada)
+        rows = self.db.query(
+            Registro.id, Registro.user_id, Registro.category_id, Registro.type_id, Registro.valor
+        ).filter(
+            self._in_period(last, data_fechamento, data_registro)
+        ).order_by(Registro.user_id, Registro.category_id, *repo._partition_order()).yield_per(BULK_BATCH_SIZE)
+
+        for key, partition in groupby(rows, key=lambda r: (r.user_id, r.category_id)):
+            debts, payments = opening.pop(key, ([], []))
+            for r in partition:
+                (debts if r.type_id == 0 else payments).append((r.id, to_cents(r.valor)))
+            yield key, debts, payments
+
+        # No activity in the period: the open items carry over as they were
+        for key, (debts, payments) in opening.items():
+            yield key, debts, payments
+
+    def _period_totals(self, last, data_fechamento: date, totals):
+        """Previous totals plus the period's, per (user, category), in cents."""
+        cents = func.cast(func.round(Registro.valor * 100), BigInteger)
+        data_registro = case((Registro.type_id == 0, Registro.data_debito), else_=Registro.data_entrada)
+        rows = self.db.query(
+            Registro.user_id, Registro.category_id,
+            func.sum(case((Registro.type_id == 0, cents), else_=0)),
+            func.sum(case((Registro.type_id == 1, cents), else_=0)),
+            func.max(case((Registro.type_id == 1, cents), else_=None)),
+        ).filter(
+            self._in_period(last, data_fechamento, data_registro)
+        ).group_by(Registro.user_id, Registro.category_id)
+
+        totals = dict(totals)
+        for user_id, category_id, dividas, entradas, maior in rows:
+            before = totals.get((user_id, category_id), (0, 0, None))
+            largest = [value for value in (before[2], maior) if value is not None]
+            totals[(user_id, category_id)] = (
+                before[0] + (dividas or 0), before[1] + (entradas or 0), max(largest) if largest else None
+            )
+        return totals
@@ -0,0 +1,120 @@
+import threading
+from sqlalchemy.orm import Session
+from database.models import Categoria, Classificacao, Usuario
+from database import change_feed
+
+class LookupCache:
+    """
+    Cache de processo (thread-safe) nome <-> id de uma tabela de domínio pequena.
+
+    É carregado na primeira consulta e compartilhado por todas as sessões; escritas
+    na tabela devem chamar refresh(). Um nome/id desconhecido força uma recarga uma
+    única vez: a falta fica guardada até o próximo refresh()/invalidate(), então um
+    filtro com um nome inexistente não vai ao banco a cada consulta. Linhas criadas
+    por outro processo chegam pelo change feed ("invalidate"), que chama invalidate().
+    """
+    def __init__(self, model, name_column):
+        self._model = model
+        self._name_column = name_column
+        self._lock = threading.Lock()
+        # (by_id, by_name, misses), swapped as a whole so readers never see a partial load;
+        # misses: (0, id) / (1, name) not found, kept until refresh()/invalidate()
+        self._maps = None
+
+    def _load(self, db: Session, misses=None):
+        rows = db.query(self._model.id, self._name_column).order_by(self._model.id).all()
+        self._maps = (
+            {row_id: name for row_id, name in rows},
+            {name: row_id for row_id, name in rows},
+            set() if misses is None else misses,
+        )
+        return self._maps
+
+    def _get_maps(self, db: Session):
+        maps = self._maps
+        if maps is None:
+            with self._lock:
+                maps = self._maps or self._load(db)
+        return maps
+
+    def refresh(self, db: Session):
+        """Reloads the table (after a create/rename)."""
+        with self._lock:
+            return self._load(db)
+
+    def invalidate(self):
+        """Drops the cached table; the next lookup reloads it."""
+        self._maps = None
+
+    def _lookup(self, db: Session, index: int, key):
+        """Looks key up in maps[index], reloading once per unknown key (see misses)."""
+        maps = self._get_maps(db)
+        if key not in maps[index] and (index, key) not in maps[2]:
+            with self._lock:
+                # The other misses stay: anything created since is in the new maps, checked first
+                maps = self._load(db, misses=maps[2])
+            if key not in maps[index]:
+                maps[2].add((index, key))
+        return maps[index].get(key)
+
+    def get_id(self, db: Session, name: str):
+        """Returns the id for a name, or None if it does not exist."""
+        return self._lookup(db, 1, name)
+
+    def get_name(self, db: Session, row_id: int):
+        """Returns the name for an id, or None if it does not exist."""
+        return self._lookup(db, 0, row_id)
+
+    def all(self, db: Session):
+        """Returns [(id, name)] ordered by id."""
+        return list(self._get_maps(db)[0].items())
+
+# Process-wide instances
+categorias_cache = LookupCache(Categoria, Categoria.categoria)
+classificacoes_cache = LookupCache(Classificacao, Classificacao.classificacao)
+
+class UserDirectoryCache:
+    """
+    Cache de processo da projeção leve de usuários (id, cpf, nome) usada em dropdowns.
+
+    Não carrega saldos; UsuarioRepository invalida a cada create/update/delete.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = None # (entries, by_id), swapped as a whole
+
+    def _load(self, db: Session):
+        rows = db.query(Usuario.id, Usuario.cpf, Usuario.nome).order_by(Usuario.nome).all()
+        entries = [{"id": i, "cpf": cpf, "nome": nome} for i, cpf, nome in rows]
+        self._entries = (entries, {e["id"]: e for e in entries})
+        return self._entries
+
+    def _get(self, db: Session):
+        loaded = self._entries
+        if loaded is None:
+            with self._lock:
+                loaded = self._entries or self._load(db)
+        return loaded
+
+    def get(self, db: Session):
+        """Returns [{'id', 'cpf', 'nome'}] ordered by nome."""
+        return self._get(db)[0]
+
+    def get_by_id(self, db: Session, user_id: int):
+        """Returns {'id', 'cpf', 'nome'} of a user (reloads once if unknown), or None."""
+        by_id = self._get(db)[1]
+        if user_id not in by_id:
+            with self._lock:
+                by_id = self._load(db)[1]
+        return by_id.get(user_id)
+
+    def invalidate(self):
+        """Drops the cached directory; the next get() reloads it."""
+        self._entries = None
+
+user_directory_cache = UserDirectoryCache()
+
+# Writes made by other processes invalidate these through the change feed
+change_feed.register_cache("categorias", categorias_cache.invalidate)
+change_feed.register_cache("classificacoes", classificacoes_cache.invalidate)
+change_feed.register_cache("usuarios", user_directory_cache.invalidate)
@@ -0,0 +1,33 @@
+"""
+Pesquisa paginada compartilhada pelos repositórios (listas da GestaoView).
+
+As consultas trazem a entidade e o total via `func.count(...).over()`, então uma
+página e o total saem de um único SELECT.
+"""
+from sqlalchemy import or_
+
+
+def like_any(term: str, *columns):
+    """Case-insensitive "contains term" over any of the columns (%, _ and \\ are literal)."""
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    pattern = f"%{escaped}%"
+    return or_(*(column.ilike(pattern, escape="\\") for column in columns))
+
+
+def fetch_page(query, offset: int = 0, limit: int = None):
+    """
+    Runs an ordered query of (entity, total) rows for one page.
+
+    Returns:
+        tuple: (lista de entidades da página, total de linhas encontradas)
+    """
+    page = query.offset(offset)
+    if limit is not None:
+        page = page.limit(limit)
+
+    rows = page.all()
+    if not rows:
+        # Página vazia: o total não vem junto das linhas
+        first = query.limit(1).first() if offset else None
+        return [], first[1] if first else 0
+    return [entity for entity, _ in rows], rows[0][1]
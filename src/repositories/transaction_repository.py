@@ -1,26 +1,61 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from database.models import Registro, Usuario, Categoria
+from sqlalchemy.orm import Session, contains_eager, joinedload
+from sqlalchemy import func, case, insert, update, select, or_, true, false, union_all, BigInteger, Float
+from database.models import Registro, Usuario, Categoria, Alocacao, Fechamento, SaldoFechamento, PendenciaFechamento
+from repositories import balance_engine
+from repositories.balance_engine import to_cents, from_cents
+from repositories.lookup_cache import categorias_cache
+from repositories.paging import like_any, fetch_page
+from database import change_feed
 from datetime import date
+from itertools import groupby
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Rows per executemany batch in bulk_create
+BULK_BATCH_SIZE = 1000
+
+# Balance of a user without records (get_user_balances)
+EMPTY_BALANCE = {"pendente": 0.0, "pagos": 0.0, "maior_pago": 0.0, "divida_antiga": "-"}
+
+
+class PeriodoFechadoError(ValueError):
+    """Escrita em um registro com data dentro de um período já fechado (ver Fechamento)."""
+
 
 class RegistroRepository:
     def __init__(self, db: Session):
         self.db = db
+        # Rows whose saldo/classificação and users whose balance changed in this repository's writes
+        self.touched_ids = set()
+        self.touched_user_ids = set()
+        self.created_ids = set()
+        # Change events not yet published (see _commit)
+        self._pending_events = {}
+        self._pending_user_ids = set()
+        # Lookup caches to refresh and invalidate in other processes on the next _commit
+        self._pending_invalidate = set()
+        # Latest close, read once per repository (see _last_close)
+        self._close = None
+        self._close_loaded = False
 
     def create(self, user_id: int, type: str, category: str, amount: float, date_obj: date, data_prevista: date = None):
+        """
+        Cria um registro e o aplica ao abatimento FIFO numa única transação.
+
+        O INSERT (com RETURNING do id), uma categoria nova, o recálculo dos saldos
+        e o ledger são gravados juntos por um único commit; em caso de erro nada
+        fica gravado.
+        O tempo de cada etapa vai para o log (DEBUG).
+        """
+        start = time.perf_counter()
         # Map Type string to ID
         # Assumed: DEBT=0, PAYMENT=1
         type_id = 0 if type == 'DEBT' else 1
         
-        # Map Category string to ID
-        cat_obj = self.db.query(Categoria).filter(Categoria.categoria == category).first()
-        if not cat_obj:
-            cat_obj = Categoria(categoria=category, repete=False)
-            self.db.add(cat_obj)
-            self.db.commit()
-            self.db.refresh(cat_obj)
-        
-        category_id = cat_obj.id
+        # Map Category string to ID (cached; unknown names are created below, in the same transaction)
+        category_id = categorias_cache.get_id(self.db, category)
 
         d_debito = None
         d_entrada = None
@@ -41,7 +76,6 @@ class RegistroRepository:
             d_entrada = date_obj
             classif_id = 3 # Payments are "Paid" by definition or just neutral. Let's say 3.
             
-        print("DEBUG: Creating Registro object...")
         db_trans = Registro(
             user_id=user_id,
             type_id=type_id,
@@ -53,34 +87,152 @@ class RegistroRepository:
             classificacao_id=classif_id,
             saldo=saldo_val
         )
-        print("DEBUG: Registro created. Adding to DB...")
-        self.db.add(db_trans)
-        print("DEBUG: Added to DB. Committing...")
         try:
-            self.db.commit()
-            print("DEBUG: Commit successful.")
-        except Exception as e:
-            print(f"DEBUG: Commit failed: {e}")
-            raise e
-        self.db.refresh(db_trans)
-        
-        # Trigger Recalculation for consistency
-        self._recalculate_balances(user_id, category_id)
-        
+            if category_id is None:
+                new_category = Categoria(categoria=category, repete=False)
+                self.db.add(new_category)
+                self.db.flush()
+                db_trans.category_id = category_id = new_category.id
+                self._pending_invalidate.add("categorias")
+            self.db.add(db_trans)
+            # INSERT ... RETURNING id (creado_em is set client-side, nothing to refresh).
+            # Checked after the INSERT: a concurrent close (which locks registros) is either seen or waits for us
+            self.db.flush()
+            self._check_open(date_obj)
+            record_id = db_trans.id
+            inserted = time.perf_counter()
+            self._track(db_trans, created=True)
+
+            # Apply the new record to the FIFO queue (falls back to a full replay if back-dated); commits
+            path = self._apply_new_record(db_trans)
+        except Exception:
+            self.db.rollback()
+            self._discard_pending()
+            raise
+
+        end = time.perf_counter()
+        logger.debug(
+            "create registro_id=%s user_id=%s category_id=%s type_id=%s fifo=%s insert_ms=%.1f fifo_ms=%.1f total_ms=%.1f",
+            record_id, user_id, category_id, type_id, path,
+            (inserted - start) * 1000, (end - inserted) * 1000, (end - start) * 1000
+        )
         return db_trans
 
+    def bulk_create(self, records):
+        """
+        Insere vários registros de uma vez (importação).
+
+        As categorias são resolvidas por um mapa carregado uma única vez, as linhas
+        são inseridas em lotes via executemany e o abatimento FIFO é recalculado
+        uma única vez por (user_id, category_id) afetado, tudo em uma transação.
+
+        Args:
+            records (list[dict]): {'user_id', 'type' ('DEBT'/'PAYMENT'), 'category',
+                'amount', 'date_obj', 'data_prevista' (opcional)}
+
+        Returns:
+            int: Quantidade de registros inseridos
+        """
+        categories = {name: cat_id for cat_id, name in categorias_cache.all(self.db)}
+        missing = {r['category'] for r in records} - categories.keys()
+        try:
+            if missing:
+                new_cats = [Categoria(categoria=name, repete=False) for name in sorted(missing)]
+                self.db.add_all(new_cats)
+                self.db.flush()
+                categories.update({c.categoria: c.id for c in new_cats})
+
+            rows = []
+            touched = set()
+            for r in records:
+                is_debt = r['type'] == 'DEBT'
+                category_id = categories[r['category']]
+                rows.append({
+                    "user_id": r['user_id'],
+                    "type_id": 0 if is_debt else 1,
+                    "category_id": category_id,
+                    "valor": r['amount'],
+                    "data_debito": r['date_obj'] if is_debt else None,
+                    "data_entrada": None if is_debt else r['date_obj'],
+                    "data_prevista": r.get('data_prevista') if is_debt else None,
+                    "classificacao_id": balance_engine.PENDENTE if is_debt else balance_engine.PAGO,
+                    "saldo": r['amount'] if is_debt else 0.0,
+                })
+                touched.add((r['user_id'], category_id))
+
+            for start in range(0, len(rows), BULK_BATCH_SIZE):
+                self.db.execute(insert(Registro), rows[start:start + BULK_BATCH_SIZE])
+            self._check_open(*(r['date_obj'] for r in records))
+
+            for user_id, category_id in touched:
+                self._recalculate_balances(user_id, category_id, commit=False)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        finally:
+            self._discard_pending()
+
+        if missing:
+            categorias_cache.refresh(self.db)
+        # Too many rows to describe one by one: subscribers reload (other processes drop their caches)
+        change_feed.publish({"reload": True, "invalidate": ["categorias"] if missing else []})
+        return len(rows)
+
     def get_by_type(self, type: str):
         """Returns transactions of a specific type (DEBT or PAYMENT), joined with Usuario."""
         type_id = 0 if type == 'DEBT' else 1
         return self.db.query(Registro).join(Usuario).options(
-            # Eager load relationships
+            # Eager load relationships (avoids 2 lazy SELECTs per row in _trans_to_dict)
+            contains_eager(Registro.usuario),
+            joinedload(Registro.categoria_rel)
         ).filter(Registro.type_id == type_id).all()
+
+    def get_by_ids(self, ids):
+        """Returns the given transactions (any type), joined with Usuario and Categoria."""
+        if not ids:
+            return []
+        return self.db.query(Registro).join(Usuario).options(
+            contains_eager(Registro.usuario),
+            joinedload(Registro.categoria_rel)
+        ).filter(Registro.id.in_(ids)).order_by(Registro.id).all()
     
-    def get_with_filters(self, user_cpf=None, data_inicial=None, data_final=None, categoria=None, tipo=None):
+    def search(self, type: str, term: str = "", limit: int = None, offset: int = 0):
         """
-        Retorna transações filtradas por múltiplos critérios.
+        Pesquisa transações de um tipo por CPF, nome ou categoria direto no SQL.
+
+        Args:
+            type (str): 'DEBT' ou 'PAYMENT'
+            term (str, optional): Trecho procurado (case-insensitive)
+            limit (int, optional): Tamanho da página. None para todos.
+            offset (int, optional): Deslocamento da página
+
+        Returns:
+            tuple: (lista de Registro da página, total de registros encontrados)
         """
-        query = self.db.query(Registro).join(Usuario)
+        type_id = 0 if type == 'DEBT' else 1
+        query = self.db.query(Registro, func.count(Registro.id).over()).join(Usuario).join(Categoria).options(
+            contains_eager(Registro.usuario),
+            contains_eager(Registro.categoria_rel)
+        ).filter(Registro.type_id == type_id)
+
+        if term:
+            query = query.filter(like_any(term, Usuario.cpf, Usuario.nome, Categoria.categoria))
+
+        return fetch_page(query.order_by(Registro.id), offset, limit)
+
+    def get_with_filters(self, user_cpf=None, data_inicial=None, data_final=None, categoria=None, tipo=None,
+                         limit: int = None, offset: int = 0):
+        """
+        Retorna transações filtradas por múltiplos critérios, da mais recente para a mais antiga.
+
+        Returns:
+            tuple: (lista de Registro da página, total de registros encontrados)
+        """
+        query = self.db.query(Registro, func.count(Registro.id).over()).join(Usuario).join(Categoria).options(
+            contains_eager(Registro.usuario),
+            contains_eager(Registro.categoria_rel)
+        )
         
         # Filtro por usuário (CPF)
         if user_cpf:
@@ -93,9 +245,9 @@ class RegistroRepository:
         
         # Filtro por categoria
         if categoria:
-            cat_obj = self.db.query(Categoria).filter(Categoria.categoria == categoria).first()
-            if cat_obj:
-                query = query.filter(Registro.category_id == cat_obj.id)
+            category_id = categorias_cache.get_id(self.db, categoria)
+            if category_id is not None:
+                query = query.filter(Registro.category_id == category_id)
         
         # Filtro por intervalo de datas
         if data_inicial or data_final:
@@ -124,10 +276,14 @@ class RegistroRepository:
                         (Registro.data_debito <= data_final) | (Registro.data_entrada <= data_final)
                     )
         
-        return query.all()
+        # Data do registro: data_debito para dívidas, data_entrada para pagamentos
+        data_registro = case((Registro.type_id == 0, Registro.data_debito), else_=Registro.data_entrada)
+        return fetch_page(query.order_by(data_registro.desc().nulls_last(), Registro.id), offset, limit)
 
     def get_by_user(self, user_id: int):
-        dodos = self.db.query(Registro).filter(Registro.user_id == user_id).all()
+        dodos = self.db.query(Registro).options(
+            joinedload(Registro.categoria_rel)
+        ).filter(Registro.user_id == user_id).all()
         return dodos
     
     def get_divi_by_user(self, user_id: int):
@@ -135,7 +291,9 @@ class RegistroRepository:
         # Assuming Pending=1, Vencido=2, Pago=3, Parcial=4
         # We want everything except Pago (3).
         # And specifically type_id=0 (DEBT)
-        return self.db.query(Registro).filter(
+        return self.db.query(Registro).options(
+            joinedload(Registro.categoria_rel)
+        ).filter(
             Registro.user_id == user_id, 
             Registro.type_id == 0,
             Registro.classificacao_id != 3
@@ -148,13 +306,15 @@ class RegistroRepository:
     def update(self, trans_id: int, category: str = None, amount: float = None, date_obj: date = None, data_prevista: date = None, new_user_cpf: str = None):
         trans = self.db.query(Registro).filter(Registro.id == trans_id).first()
         if trans:
+            old_user_id = trans.user_id
             old_category_id = trans.category_id
+            old_date = trans.data_debito if trans.type_id == 0 else trans.data_entrada
             
             if category: 
                 # resolving category
-                cat_obj = self.db.query(Categoria).filter(Categoria.categoria == category).first()
-                if cat_obj:
-                     trans.category_id = cat_obj.id
+                category_id = categorias_cache.get_id(self.db, category)
+                if category_id is not None:
+                     trans.category_id = category_id
             if amount is not None: trans.valor = amount
             
             # Date logic for Update
@@ -168,14 +328,18 @@ class RegistroRepository:
                 user = self.db.query(Usuario).filter(Usuario.cpf == new_user_cpf).first()
                 if user:
                     trans.user_id = user.id
+
+            self.db.flush()
+            self._check_open(old_date, date_obj)
+            self._track(trans)
+            self._touch_user(old_user_id)
             
-            self.db.commit()
-            self.db.refresh(trans)
-            
-            # Recalculate balances for old category (if changed) and new category
-            self._recalculate_balances(trans.user_id, old_category_id)
-            if old_category_id != trans.category_id:
-                self._recalculate_balances(trans.user_id, trans.category_id)
+            # Recalculate balances for the old partition (if user/category changed) and the new one,
+            # in the same transaction as the edit
+            self._recalculate_balances(old_user_id, old_category_id, commit=False)
+            if (old_user_id, old_category_id) != (trans.user_id, trans.category_id):
+                self._recalculate_balances(trans.user_id, trans.category_id, commit=False)
+            self._commit()
             
         return trans
 
@@ -184,64 +348,485 @@ class RegistroRepository:
         if trans:
             user_id = trans.user_id
             cat_id = trans.category_id
+            trans_date = trans.data_debito if trans.type_id == 0 else trans.data_entrada
+            self._track(trans, deleted=True)
+            self.delete_allocations([trans.id])
             self.db.delete(trans)
-            self.db.commit()
+            self.db.flush()
+            self._check_open(trans_date)
             
-            # Recalculate after deletion
+            # Recalculate after deletion (same transaction; commits)
             self._recalculate_balances(user_id, cat_id)
             return True
         return False
 
-    def _recalculate_balances(self, user_id: int, category_id: int):
+    def _debt_order(self):
+        """FIFO order of debts within a (user, category)."""
+        return (Registro.data_debito, Registro.creado_em, Registro.id)
+
+    def _payment_order(self):
+        """Order in which payments are allocated (ledger) within a (user, category)."""
+        return (Registro.data_entrada, Registro.creado_em, Registro.id)
+
+    def _partition_order(self):
+        """Debts in FIFO order, then payments in payment order (single pass over a partition)."""
+        date = case((Registro.type_id == 0, Registro.data_debito), else_=Registro.data_entrada)
+        return (Registro.type_id, date, Registro.creado_em, Registro.id)
+
+    def _sorts_after(self, order, key):
+        """Rows whose (3-column) order sorts after key; a NULL first column counts as after."""
+        first, second, third = order
+        return (
+            (first > key[0]) |
+            ((first == key[0]) & (second > key[1])) |
+            ((first == key[0]) & (second == key[1]) & (third > key[2])) |
+            first.is_(None)
+        )
+
+    # ==========================
+    # Period close (fechamentos)
+    # ==========================
+
+    def _last_close(self):
+        """Latest close as (fechamento_id, data_fechamento), or None."""
+        if not self._close_loaded:
+            self._close = self.db.query(Fechamento.id, Fechamento.data_fechamento).order_by(
+                Fechamento.data_fechamento.desc()
+            ).first()
+            self._close_loaded = True
+        return self._close
+
+    def _check_open(self, *dates):
+        """Rolls back and raises PeriodoFechadoError if any date falls in a closed period."""
+        self._close_loaded = False # Always re-read: a close may have just committed
+        closed = self._last_close()
+        if closed and any(d is not None and d <= closed.data_fechamento for d in dates):
+            self.db.rollback()
+            self._discard_pending()
+            raise PeriodoFechadoError(
+                f"Período fechado até {closed.data_fechamento.strftime('%d/%m/%Y')}: "
+                "registros com data até essa data não podem ser alterados."
+            )
+
+    def _after_close(self, closed_until: date, column):
+        """Rows dated after the close (undated rows count as after, as in _sorts_after)."""
+        return (column > closed_until) | column.is_(None)
+
+    def _checkpoint(self, user_id: int, category_id: int):
+        """
+        Starting point of the FIFO of a (user, category) at the last close.
+
+        Returns:
+            tuple: (data_fechamento or None, {registro_id: centavos em aberto}) —
+                the open amount of each debt not paid off and the unallocated
+                credit of each payment, as of the close date
+        """
+        closed = self._last_close()
+        if not closed:
+            return None, {}
+        opening = dict(self.db.query(PendenciaFechamento.registro_id, PendenciaFechamento.valor_centavos).filter(
+            PendenciaFechamento.fechamento_id == closed.id,
+            PendenciaFechamento.user_id == user_id,
+            PendenciaFechamento.category_id == category_id
+        ).all())
+        return closed.data_fechamento, opening
+
+    def _recalculate_balances(self, user_id: int, category_id: int, commit: bool = True, full: bool = False):
         """
         Recalculates the balance of all debts for a specific user and category based on payments.
         Logic:
         1. Reset all Debts in this category for this user to 'Pendente' (1) and saldo = valor.
-        2. Fetch all Payments in this category for this user, ordered by date.
-        3. Apply payments strictly FIFO to debts ordered by date.
+        2. Sum all Payments in this category for this user.
+        3. Apply the payment pool strictly FIFO to debts ordered by date.
+
+        After a period close only the records dated after it are read, starting from
+        the checkpoint: the debts still open at the close (with their open amount)
+        come first in the queue and the payments' leftover credit joins the pool.
+        full=True ignores the checkpoint and replays the whole history (repairs of
+        rows inside a closed period, see check_balances.py).
         """
+        closed_until, opening = (None, {}) if full else self._checkpoint(user_id, category_id)
+        in_scope = {0: true(), 1: true()}
+        if closed_until:
+            in_scope = {
+                0: self._after_close(closed_until, Registro.data_debito) | Registro.id.in_(list(opening)),
+                1: self._after_close(closed_until, Registro.data_entrada) | Registro.id.in_(list(opening)),
+            }
+
         # 1. Reset Debts
         debts = self.db.query(Registro).filter(
             Registro.user_id == user_id,
             Registro.category_id == category_id,
-            Registro.type_id == 0 # DEBT
-        ).order_by(Registro.data_debito, Registro.creado_em).all()
+            Registro.type_id == 0, # DEBT
+            in_scope[0]
+        ).order_by(*self._debt_order()).all()
+        before = {debt.id: (debt.saldo, debt.classificacao_id) for debt in debts}
 
         for debt in debts:
-            debt.saldo = debt.valor
-            debt.classificacao_id = 1 # Pendente
+            if debt.id in opening:
+                debt.saldo = from_cents(opening[debt.id])
+                debt.classificacao_id = (
+                    balance_engine.PARCIAL if opening[debt.id] < to_cents(debt.valor) else balance_engine.PENDENTE
+                )
+            else:
+                debt.saldo = debt.valor
+                debt.classificacao_id = balance_engine.PENDENTE
         
-        # 2. Fetch Payments
-        payments = self.db.query(Registro).filter(
-            Registro.user_id == user_id,
-            Registro.category_id == category_id,
-            Registro.type_id == 1 # PAYMENT
-        ).order_by(Registro.data_entrada, Registro.creado_em).all()
+        # 2. Payment pool
+        payments = [
+            (payment_id, opening.get(payment_id, to_cents(valor)))
+            for payment_id, valor in self.db.query(Registro.id, Registro.valor).filter(
+                Registro.user_id == user_id,
+                Registro.category_id == category_id,
+                Registro.type_id == 1, # PAYMENT
+                in_scope[1]
+            ).order_by(*self._payment_order())
+        ]
+        pool = sum(cents for _, cents in payments)
 
         # 3. Apply Payments (FIFO)
-        debt_idx = 0
-        total_payment_pool = sum(p.valor for p in payments)
-        
-        # Optimization: Apply total pool to debts in order
-        remaining_pool = total_payment_pool
-        
-        # Iterate over debts and pay them off with the pool
+        self._apply_pool(debts, pool, checkpoint=opening)
+        self._reconcile_ledger(
+            user_id, category_id,
+            [(debt.id, opening.get(debt.id, to_cents(debt.valor))) for debt in debts],
+            payments,
+            closed_until=closed_until,
+            checkpoint=opening
+        )
         for debt in debts:
-            if remaining_pool <= 0:
-                break
-            
-            if remaining_pool >= debt.saldo:
-                # Fully pay this debt
-                remaining_pool -= debt.saldo
-                debt.saldo = 0.0
-                debt.classificacao_id = 3 # Pago
-            else:
-                # Partially pay
-                debt.saldo -= remaining_pool
-                remaining_pool = 0.0
-                debt.classificacao_id = 4 # Parcial
-        
+            if (debt.saldo, debt.classificacao_id) != before[debt.id]:
+                self._track(debt)
+        self._touch_user(user_id)
+        if commit:
+            self._commit()
+
+    def rebuild_balances(self):
+        """
+        Recalcula saldo/classificação de todas as dívidas (todos os usuários e
+        categorias) num único UPDATE set-based, equivalente a _recalculate_balances
+        em cada par (usuário, categoria).
+
+        Em centavos: a soma acumulada das dívidas na ordem FIFO (janela por par)
+        é comparada com o total de pagamentos do par; quitada se o total cobre a
+        soma acumulada, parcial se cobre só a anterior, pendente caso contrário.
+        Só as linhas que mudam (em centavos) são escritas. Publica um reload no
+        change feed.
+
+        Returns:
+            int: Número de dívidas atualizadas
+        """
+        cents = func.cast(func.round(Registro.valor * 100), BigInteger)
+        partition = (Registro.user_id, Registro.category_id)
+
+        pools = self.db.query(
+            Registro.user_id, Registro.category_id, func.sum(cents).label("pool")
+        ).filter(Registro.type_id == 1).group_by(*partition).subquery()
+
+        debts = self.db.query(
+            Registro.id.label("id"),
+            Registro.valor.label("valor"),
+            cents.label("cents"),
+            func.sum(cents).over(partition_by=partition, order_by=self._debt_order(), rows=(None, 0)).label("running"),
+            func.coalesce(pools.c.pool, 0).label("pool"),
+        ).outerjoin(
+            pools, (pools.c.user_id == Registro.user_id) & (pools.c.category_id == Registro.category_id)
+        ).filter(Registro.type_id == 0).subquery()
+
+        # Same rules as balance_engine.allocate (a debt is only reached while pool > 0)
+        reached = debts.c.pool > debts.c.running - debts.c.cents
+        paid = reached & (debts.c.pool >= debts.c.running)
+        new_cents = case(
+            (paid, 0),
+            (reached, debts.c.running - debts.c.pool),
+            else_=debts.c.cents
+        )
+        new_saldo = case(
+            (paid, 0.0),
+            (reached, func.cast(debts.c.running - debts.c.pool, Float) / 100),
+            else_=debts.c.valor
+        )
+        new_classificacao = case(
+            (paid, balance_engine.PAGO),
+            (reached, balance_engine.PARCIAL),
+            else_=balance_engine.PENDENTE
+        )
+
+        result = self.db.execute(
+            update(Registro).where(
+                Registro.id == debts.c.id,
+                # Compared in cents: a float saldo never matches the computed one bit for bit
+                func.cast(func.round(Registro.saldo * 100), BigInteger).is_distinct_from(new_cents) |
+                Registro.classificacao_id.is_distinct_from(new_classificacao)
+            ).values(saldo=new_saldo, classificacao_id=new_classificacao).execution_options(synchronize_session=False)
+        )
+        self.db.commit()
+        change_feed.publish({"reload": True})
+        return result.rowcount
+
+    def _apply_new_record(self, trans: Registro):
+        """
+        Applies a newly created record to the FIFO queue without a full replay.
+
+        - PAYMENT: the pool is a plain sum, so the new amount only has to be poured
+          over the open tail of the queue, starting at the watermark (the first debt
+          not fully paid). Its ledger rows are exactly what it paid. A back-dated
+          payment keeps the balances but shifts which payment paid which debt, so
+          it falls back to _recalculate_balances.
+        - DEBT: when it sorts after every other debt, it only receives the leftover
+          credit (payments not yet allocated, in payment order). A back-dated debt
+          changes the order of the queue and falls back to _recalculate_balances.
+
+        Commits (and publishes) the write.
+
+        Returns:
+            str: 'incremental' or 'replay' (which path was taken)
+        """
+        partition = (
+            Registro.user_id == trans.user_id,
+            Registro.category_id == trans.category_id,
+        )
+        self._touch_user(trans.user_id)
+
+        if trans.type_id == 1:
+            later_payments = self.db.query(func.count(Registro.id)).filter(
+                *partition,
+                Registro.type_id == 1,
+                Registro.id != trans.id,
+                self._sorts_after(self._payment_order(), (trans.data_entrada, trans.creado_em, trans.id))
+            ).scalar()
+            if later_payments or trans.data_entrada is None:
+                self._recalculate_balances(trans.user_id, trans.category_id)
+                return "replay"
+
+            open_debts = self.db.query(Registro).filter(
+                *partition,
+                Registro.type_id == 0,
+                Registro.classificacao_id != balance_engine.PAGO
+            ).order_by(*self._debt_order()).all()
+            paid = self._apply_pool(open_debts, to_cents(trans.valor), reset=False)
+            self._append_ledger([(trans.id, debt_id, cents) for debt_id, cents in paid])
+            self._commit()
+            return "incremental"
+
+        later_debts = self.db.query(func.count(Registro.id)).filter(
+            *partition,
+            Registro.type_id == 0,
+            Registro.id != trans.id,
+            self._sorts_after(self._debt_order(), (trans.data_debito, trans.creado_em, trans.id))
+        ).scalar()
+
+        if later_debts or trans.data_debito is None:
+            self._recalculate_balances(trans.user_id, trans.category_id)
+            return "replay"
+
+        # Leftover credit = what the payments still have unallocated in the ledger
+        remainders = self._payment_remainders(partition)
+        paid = self._apply_pool([trans], sum(cents for _, cents in remainders), reset=False)
+        if paid:
+            self._append_ledger(balance_engine.allocations(paid, remainders))
+        self._commit()
+        return "incremental"
+
+    def _apply_pool(self, debts, pool: int, reset: bool = True, checkpoint=None):
+        """
+        Pours `pool` cents over the (ordered) debt rows and writes saldo/classificacao_id.
+
+        With reset, debts start from valor, or from their open amount in `checkpoint`
+        ({debt_id: centavos}, see _checkpoint); otherwise from the current saldo.
+
+        Returns:
+            list: [(debt_id, centavos abatidos)] of the debts reached
+        """
+        by_id = {d.id: d for d in debts}
+        checkpoint = checkpoint or {}
+        opening = [
+            (d.id, checkpoint[d.id] if reset and d.id in checkpoint else to_cents(d.valor if reset else d.saldo))
+            for d in debts
+        ]
+        updates, _ = balance_engine.allocate(opening, pool)
+        for debt_id, saldo_cents, classificacao_id in updates:
+            by_id[debt_id].saldo = from_cents(saldo_cents)
+            by_id[debt_id].classificacao_id = classificacao_id
+        if not reset:
+            for debt_id, _, _ in updates:
+                self._track(by_id[debt_id])
+        opening = dict(opening)
+        return [(debt_id, opening[debt_id] - saldo_cents) for debt_id, saldo_cents, _ in updates]
+
+    # ==========================
+    # Allocation ledger (alocacoes)
+    # ==========================
+
+    def _append_ledger(self, allocations):
+        """Appends [(payment_id, debt_id, centavos)] to the ledger (zero amounts are skipped)."""
+        rows = [
+            {"payment_id": payment_id, "debt_id": debt_id, "valor_centavos": cents}
+            for payment_id, debt_id, cents in allocations
+            if cents
+        ]
+        if rows:
+            self.db.execute(insert(Alocacao), rows)
+
+    def _payment_remainders(self, partition):
+        """[(payment_id, centavos ainda não alocados)] of a partition, in payment order."""
+        allocated = select(func.coalesce(func.sum(Alocacao.valor_centavos), 0)).where(
+            Alocacao.payment_id == Registro.id
+        ).scalar_subquery()
+        query = self.db.query(Registro.id, Registro.valor, allocated).filter(*partition, Registro.type_id == 1)
+
+        closed = self._last_close()
+        if closed:
+            # Payments of the closed period only have credit left if the checkpoint says so
+            has_credit = select(PendenciaFechamento.id).where(
+                PendenciaFechamento.registro_id == Registro.id,
+                PendenciaFechamento.fechamento_id == closed.id
+            ).exists()
+            query = query.filter(self._after_close(closed.data_fechamento, Registro.data_entrada) | has_credit)
+        rows = query.order_by(*self._payment_order()).all()
+        remainders = [(payment_id, to_cents(valor) - cents) for payment_id, valor, cents in rows]
+        return [(payment_id, cents) for payment_id, cents in remainders if cents > 0]
+
+    def _reconcile_ledger(self, user_id: int, category_id: int, debts, payments, closed_until: date = None,
+                          checkpoint=None):
+        """
+        Brings the ledger of a (user, category) in line with a full replay.
+
+        Args:
+            debts (list): [(debt_id, centavos)] in FIFO order
+            payments (list): [(payment_id, centavos)] in payment order
+            closed_until (date, optional): Last close; debts/payments are then the
+                ones after it plus the checkpoint (with their open amounts)
+            checkpoint (dict, optional): {registro_id: centavos} of the checkpoint
+
+        Nothing is rewritten: for each (payment, debt) pair whose amount changed, a
+        row with the difference is appended. Pairs are found through the debt, so
+        a record that moved to another partition is settled when that one is. Pairs
+        between two records of a closed period are final and left alone.
+        """
+        target = {(p, d): cents for p, d, cents in balance_engine.allocations(debts, payments)}
+        ledger = self.db.query(
+            Alocacao.payment_id, Alocacao.debt_id, func.sum(Alocacao.valor_centavos)
+        ).filter(Alocacao.debt_id.in_([debt_id for debt_id, _ in debts]))
+
+        closed_debts = [debt_id for debt_id, _ in debts if debt_id in (checkpoint or {})]
+        if closed_until and closed_debts:
+            closed_payments = select(Registro.id).where(
+                Registro.user_id == user_id,
+                Registro.category_id == category_id,
+                Registro.type_id == 1,
+                Registro.data_entrada <= closed_until
+            )
+            ledger = ledger.filter(Alocacao.debt_id.not_in(closed_debts) | Alocacao.payment_id.not_in(closed_payments))
+
+        current = {
+            (p, d): cents
+            for p, d, cents in ledger.group_by(Alocacao.payment_id, Alocacao.debt_id)
+        }
+        self._append_ledger(
+            (p, d, target.get((p, d), 0) - current.get((p, d), 0))
+            for p, d in sorted(target.keys() | current.keys())
+        )
+
+    def delete_allocations(self, registro_ids):
+        """Removes the ledger rows of records about to be deleted (not committed); the pairs go with the record."""
+        if registro_ids:
+            self.db.query(Alocacao).filter(
+                or_(Alocacao.payment_id.in_(registro_ids), Alocacao.debt_id.in_(registro_ids))
+            ).delete(synchronize_session=False)
+
+    def rebuild_ledger(self):
+        """
+        Recria o ledger inteiro a partir dos registros, numa passada ordenada.
+
+        Usado para preencher a tabela num banco existente (migração) e depois de
+        correções feitas direto no banco (rebuild_balances.py).
+
+        Returns:
+            int: Linhas gravadas
+        """
+        rows = self.db.query(
+            Registro.id, Registro.user_id, Registro.category_id, Registro.type_id, Registro.valor
+        ).order_by(Registro.user_id, Registro.category_id, *self._partition_order()).yield_per(BULK_BATCH_SIZE)
+
+        self.db.query(Alocacao).delete(synchronize_session=False)
+        written = 0
+        batch = []
+        for _, partition in groupby(rows, key=lambda r: (r.user_id, r.category_id)):
+            partition = list(partition)
+            batch.extend(balance_engine.allocations(
+                [(r.id, to_cents(r.valor)) for r in partition if r.type_id == 0],
+                [(r.id, to_cents(r.valor)) for r in partition if r.type_id == 1]
+            ))
+            if len(batch) >= BULK_BATCH_SIZE:
+                self._append_ledger(batch)
+                written += len(batch)
+                batch = []
+        self._append_ledger(batch)
+        written += len(batch)
+        self.db.commit()
+        return written
+
+    def get_allocations_by_payment(self, payment_id: int):
+        """O que um pagamento quitou: [(Registro da dívida, centavos)] em ordem FIFO."""
+        return self._allocations(Alocacao.payment_id == payment_id, Alocacao.debt_id, self._debt_order())
+
+    def get_allocations_by_debt(self, debt_id: int):
+        """Quem pagou uma dívida: [(Registro do pagamento, centavos)] em ordem de pagamento."""
+        return self._allocations(Alocacao.debt_id == debt_id, Alocacao.payment_id, self._payment_order())
+
+    def _allocations(self, condition, other_side, order):
+        # Net amount per pair first (index range scan), then the records
+        sums = self.db.query(
+            other_side.label("registro_id"), func.sum(Alocacao.valor_centavos).label("cents")
+        ).filter(condition).group_by(other_side).subquery()
+        return self.db.query(Registro, sums.c.cents).join(
+            sums, sums.c.registro_id == Registro.id
+        ).options(joinedload(Registro.categoria_rel)).filter(sums.c.cents > 0).order_by(*order).all()
+
+    def _touch_user(self, user_id: int):
+        """Marks a user whose balance changed in this write."""
+        self.touched_user_ids.add(user_id)
+        self._pending_user_ids.add(user_id)
+
+    def _track(self, registro: Registro, deleted: bool = False, created: bool = False):
+        """Records a written row (and its change event, read before the commit expires it)."""
+        if not deleted:
+            self.touched_ids.add(registro.id)
+        if created:
+            self.created_ids.add(registro.id)
+        self._touch_user(registro.user_id)
+        # A row created in this write stays 'created' when the allocation touches it again
+        created = created or self._pending_events.get(registro.id, {}).get("created", False)
+        self._pending_events[registro.id] = change_feed.registro_event(registro, deleted, created)
+
+    def _commit(self):
+        """
+        Commits and publishes the change feed message of the rows written since the
+        last publish, with the new totals of the affected users (one grouped query)
+        and the lookup caches to invalidate (a category created by create()).
+        """
+        events = list(self._pending_events.values())
+        user_ids = sorted(self._pending_user_ids)
+        invalidate = sorted(self._pending_invalidate)
         self.db.commit()
+        self._discard_pending()
+        if "categorias" in invalidate:
+            categorias_cache.refresh(self.db)
+        if not events and not user_ids and not invalidate:
+            return
+
+        balances = self.get_user_balances(user_ids)
+        message = {
+            "registros": events,
+            "usuarios": [change_feed.usuario_event(user_id, balance=balances[user_id]) for user_id in user_ids],
+        }
+        if invalidate:
+            message["invalidate"] = invalidate
+        change_feed.publish(message)
+
+    def _discard_pending(self):
+        """Forgets the unpublished changes (after a commit or a rollback)."""
+        self._pending_events, self._pending_user_ids, self._pending_invalidate = {}, set(), set()
 
     def get_summary_metrics(self, user_cpf=None, data_inicial=None, data_final=None, categoria=None, tipo=None):
         """
@@ -254,47 +839,47 @@ class RegistroRepository:
             categoria (str, optional): Nome da categoria
             tipo (str, optional): Tipo da transação ('DEBT', 'PAYMENT', ou None para todos)
         """
-        # Query base para dívidas
-        debt_query = self.db.query(func.sum(Registro.valor)).filter(Registro.type_id == 0)
-        debt_max_query = self.db.query(func.max(Registro.valor)).filter(Registro.type_id == 0)
-        
-        # Query base para entradas
-        payment_query = self.db.query(func.sum(Registro.valor)).filter(Registro.type_id == 1)
-        payment_max_query = self.db.query(func.max(Registro.valor)).filter(Registro.type_id == 1)
-        
+        # Condições por tipo: dívidas filtram por data_debito, entradas por data_entrada
+        is_debt = Registro.type_id == 0
+        is_payment = Registro.type_id == 1
+
+        if data_inicial:
+            is_debt = is_debt & (Registro.data_debito >= data_inicial)
+            is_payment = is_payment & (Registro.data_entrada >= data_inicial)
+
+        if data_final:
+            is_debt = is_debt & (Registro.data_debito <= data_final)
+            is_payment = is_payment & (Registro.data_entrada <= data_final)
+
+        # Filtro por tipo: o outro lado fica zerado
+        if tipo == 'DEBT':
+            is_payment = false()
+        elif tipo == 'PAYMENT':
+            is_debt = false()
+
+        # Uma única consulta com agregação condicional
+        query = self.db.query(
+            func.sum(case((is_debt, Registro.valor), else_=None)),
+            func.sum(case((is_payment, Registro.valor), else_=None)),
+            func.max(case((is_debt, Registro.valor), else_=None)),
+            func.max(case((is_payment, Registro.valor), else_=None)),
+        ).filter(is_debt | is_payment)
+
         # Aplicar filtros comuns
         if user_cpf:
-            debt_query = debt_query.join(Usuario).filter(Usuario.cpf == user_cpf)
-            debt_max_query = debt_max_query.join(Usuario).filter(Usuario.cpf == user_cpf)
-            payment_query = payment_query.join(Usuario).filter(Usuario.cpf == user_cpf)
-            payment_max_query = payment_max_query.join(Usuario).filter(Usuario.cpf == user_cpf)
-        
+            query = query.join(Usuario).filter(Usuario.cpf == user_cpf)
+
         if categoria:
-            cat_obj = self.db.query(Categoria).filter(Categoria.categoria == categoria).first()
-            if cat_obj:
-                debt_query = debt_query.filter(Registro.category_id == cat_obj.id)
-                debt_max_query = debt_max_query.filter(Registro.category_id == cat_obj.id)
-                payment_query = payment_query.filter(Registro.category_id == cat_obj.id)
-                payment_max_query = payment_max_query.filter(Registro.category_id == cat_obj.id)
-        
-        # Filtros de data
-        if data_inicial:
-            debt_query = debt_query.filter(Registro.data_debito >= data_inicial)
-            debt_max_query = debt_max_query.filter(Registro.data_debito >= data_inicial)
-            payment_query = payment_query.filter(Registro.data_entrada >= data_inicial)
-            payment_max_query = payment_max_query.filter(Registro.data_entrada >= data_inicial)
-        
-        if data_final:
-            debt_query = debt_query.filter(Registro.data_debito <= data_final)
-            debt_max_query = debt_max_query.filter(Registro.data_debito <= data_final)
-            payment_query = payment_query.filter(Registro.data_entrada <= data_final)
-            payment_max_query = payment_max_query.filter(Registro.data_entrada <= data_final)
-        
-        # Executar queries
-        total_debts = debt_query.scalar() or 0.0
-        total_payments = payment_query.scalar() or 0.0
-        max_debt = debt_max_query.scalar() or 0.0
-        max_payment = payment_max_query.scalar() or 0.0
+            category_id = categorias_cache.get_id(self.db, categoria)
+            if category_id is not None:
+                query = query.filter(Registro.category_id == category_id)
+
+        # Executar query
+        total_debts, total_payments, max_debt, max_payment = query.one()
+        total_debts = total_debts or 0.0
+        total_payments = total_payments or 0.0
+        max_debt = max_debt or 0.0
+        max_payment = max_payment or 0.0
         
         return {
             "total_dividas": total_debts,
@@ -378,6 +963,100 @@ class RegistroRepository:
             "divida_antiga": divida_antiga
         }
 
+    def get_user_balances(self, user_ids=None):
+        """
+        Calcula o balanço de vários usuários de uma só vez.
+
+        Equivalente a chamar get_user_balance para cada usuário, mas resolvido em
+        uma única consulta agrupada por user_id (a dívida mais antiga vem de uma
+        window function), mantendo o número de consultas constante. Depois de um
+        fechamento, os totais até a data vêm de saldos_fechamento e só os
+        registros posteriores são somados.
+
+        Args:
+            user_ids (list[int], optional): IDs dos usuários. None para todos.
+
+        Returns:
+            dict: {user_id: {'pendente', 'pagos', 'maior_pago', 'divida_antiga'}}
+        """
+        if user_ids is not None and not user_ids:
+            return {}
+
+        recent_query = self.db.query(
+            Registro.user_id.label("user_id"),
+            case((Registro.type_id == 0, Registro.valor), else_=0.0).label("dividas"),
+            case((Registro.type_id == 1, Registro.valor), else_=0.0).label("entradas"),
+            case((Registro.type_id == 1, Registro.valor), else_=None).label("maior"),
+        )
+        oldest_query = self.db.query(
+            Registro.user_id.label("user_id"),
+            Registro.valor.label("valor"),
+            Registro.data_debito.label("data_debito"),
+            # Undated debts last (instead of filtered out), so the plan stays on the user's rows
+            func.row_number().over(
+                partition_by=Registro.user_id,
+                order_by=(Registro.data_debito.nulls_last(), Registro.id)
+            ).label("rn"),
+        ).filter(Registro.type_id == 0)
+
+        if user_ids is not None:
+            recent_query = recent_query.filter(Registro.user_id.in_(user_ids))
+            oldest_query = oldest_query.filter(Registro.user_id.in_(user_ids))
+
+        closed = self._last_close()
+        if closed:
+            data_registro = case((Registro.type_id == 0, Registro.data_debito), else_=Registro.data_entrada)
+            recent_query = recent_query.filter(self._after_close(closed.data_fechamento, data_registro))
+
+        parts = [recent_query]
+        if closed:
+            closed_query = self.db.query(
+                SaldoFechamento.user_id.label("user_id"),
+                (func.cast(SaldoFechamento.total_dividas_centavos, Float) / 100).label("dividas"),
+                (func.cast(SaldoFechamento.total_entradas_centavos, Float) / 100).label("entradas"),
+                (func.cast(SaldoFechamento.maior_entrada_centavos, Float) / 100).label("maior"),
+            ).filter(SaldoFechamento.fechamento_id == closed.id)
+            if user_ids is not None:
+                closed_query = closed_query.filter(SaldoFechamento.user_id.in_(user_ids))
+            parts.append(closed_query)
+
+        rows_by_user = union_all(*[part.statement for part in parts]).subquery()
+        totals = self.db.query(
+            rows_by_user.c.user_id.label("user_id"),
+            func.sum(rows_by_user.c.dividas).label("pendente"),
+            func.sum(rows_by_user.c.entradas).label("pagos"),
+            func.max(rows_by_user.c.maior).label("maior_pago"),
+        ).group_by(rows_by_user.c.user_id).subquery()
+        oldest = oldest_query.subquery()
+
+        rows = self.db.query(
+            totals.c.user_id,
+            totals.c.pendente,
+            totals.c.pagos,
+            totals.c.maior_pago,
+            oldest.c.valor,
+            oldest.c.data_debito,
+        ).outerjoin(
+            oldest, (oldest.c.user_id == totals.c.user_id) & (oldest.c.rn == 1)
+        ).all()
+
+        balances = {}
+        for user_id, pendente, pagos, maior_pago, old_valor, old_data in rows:
+            divida_antiga = "-"
+            if old_data:
+                divida_antiga = f"R$ {old_valor:.2f}  {old_data.strftime('%d-%b-%Y')}"
+            balances[user_id] = {
+                "pendente": pendente or 0.0,
+                "pagos": pagos or 0.0,
+                "maior_pago": maior_pago or 0.0,
+                "divida_antiga": divida_antiga
+            }
+
+        # Usuários sem registros não aparecem no GROUP BY
+        for user_id in (user_ids or []):
+            balances.setdefault(user_id, dict(EMPTY_BALANCE))
+        return balances
+
 class CategoriasRepository:
     def __init__(self, db: Session):
         self.db = db
@@ -402,4 +1081,6 @@ class CategoriasRepository:
         self.db.add(cat_obj)
         self.db.commit()
         self.db.refresh(cat_obj)
+        categorias_cache.refresh(self.db)
+        change_feed.publish({"invalidate": ["categorias"]})
         return cat_obj
\ No newline at end of file
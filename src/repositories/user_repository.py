@@ -1,6 +1,11 @@
 from sqlalchemy.orm import Session
-from database.models import Usuario
-from sqlalchemy import exc
+from database.models import Usuario, Registro
+from sqlalchemy import exc, func, case
+from repositories.lookup_cache import user_directory_cache
+from repositories.paging import like_any, fetch_page
+from repositories.transaction_repository import EMPTY_BALANCE, RegistroRepository
+from repositories.fechamento_repository import FechamentoRepository
+from database import change_feed
 
 class UsuarioRepository:
     def __init__(self, db: Session):
@@ -12,12 +17,41 @@ class UsuarioRepository:
     def get_all(self):
         return self.db.query(Usuario).all()
 
+    def search(self, term: str = "", limit: int = None, offset: int = 0):
+        """
+        Pesquisa usuários por CPF ou nome direto no SQL, paginado por id.
+
+        Returns:
+            tuple: (lista de Usuario da página, total de usuários encontrados)
+        """
+        query = self.db.query(Usuario, func.count(Usuario.id).over())
+        if term:
+            query = query.filter(like_any(term, Usuario.cpf, Usuario.nome))
+
+        return fetch_page(query.order_by(Usuario.id), offset, limit)
+
+    def get_by_ids(self, ids):
+        if not ids:
+            return []
+        return self.db.query(Usuario).filter(Usuario.id.in_(ids)).all()
+
+    def get_directory(self):
+        """Lightweight cached list of users (id, cpf, nome) for dropdowns; no balances."""
+        return user_directory_cache.get(self.db)
+
     def create(self, cpf: str, nome: str, senha: str = None, is_admin: bool = False):
         db_user = Usuario(cpf=cpf, nome=nome, senha=senha, is_admin=is_admin)
         try:
             self.db.add(db_user)
             self.db.commit()
             self.db.refresh(db_user)
+            user_directory_cache.invalidate()
+            change_feed.publish({
+                "usuarios": [
+                    change_feed.usuario_event(db_user.id, db_user.cpf, db_user.nome, balance=dict(EMPTY_BALANCE), created=True)
+                ],
+                "invalidate": ["usuarios"],
+            })
             return db_user
         except exc.IntegrityError:
             self.db.rollback()
@@ -32,12 +66,42 @@ class UsuarioRepository:
                 user.senha = senha
             self.db.commit()
             self.db.refresh(user)
+            if nome:
+                user_directory_cache.invalidate()
+                # The name is also shown on every transaction card of the user
+                change_feed.publish({
+                    "registros": [change_feed.registro_event(r) for r in user.registros],
+                    "usuarios": [change_feed.usuario_event(user.id, user.cpf, user.nome)],
+                    "invalidate": ["usuarios"],
+                })
         return user
 
     def delete(self, cpf: str):
+        """
+        Remove o usuário e todos os seus registros.
+
+        Raises:
+            PeriodoFechadoError: O usuário tem registros num período fechado (removê-los
+                mudaria os totais já fechados; reabra o período antes)
+        """
         user = self.get_by_cpf(cpf)
         if user:
+            oldest = self.db.query(func.min(
+                case((Registro.type_id == 0, Registro.data_debito), else_=Registro.data_entrada)
+            )).filter(Registro.user_id == user.id).scalar()
+            RegistroRepository(self.db)._check_open(oldest)
+
+            # Records go with the user (delete-orphan cascade); read them before the commit
+            message = {
+                "registros": [change_feed.registro_event(r, deleted=True) for r in user.registros],
+                "usuarios": [change_feed.usuario_event(user.id, user.cpf, deleted=True)],
+                "invalidate": ["usuarios"],
+            }
+            RegistroRepository(self.db).delete_allocations([r.id for r in user.registros])
+            FechamentoRepository(self.db).delete_user(user.id)
             self.db.delete(user)
             self.db.commit()
+            user_directory_cache.invalidate()
+            change_feed.publish(message)
             return True
         return False
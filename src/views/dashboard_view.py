@@ -1,5 +1,6 @@
 import flet as ft
 from controllers.dashboard_controller import DashboardController
+from database import change_feed
 
 class DashboardView(ft.Column):
     def __init__(self, page: ft.Page, controller: DashboardController, user_name: str, user_id: int):
@@ -12,11 +13,31 @@ class DashboardView(ft.Column):
         self.page.bgcolor = ft.Colors.WHITE
         self.scroll = ft.ScrollMode.AUTO
         
-        # Fetch Data
-        self.data = self.controller.get_dividas_data(self.user_id)
+        # Fetch Data (open debts per record, so live updates can patch them)
+        self.open_debts = self.controller.get_open_debts(self.user_id)
+        self.data = self.controller.summarize_debts(self.open_debts)
         
         self._build_ui()
 
+    def did_mount(self):
+        super().did_mount()
+        # Payments/debts registered by the admins show up without a reload
+        change_feed.subscribe(self.page, self._on_change_message)
+
+    def will_unmount(self):
+        change_feed.unsubscribe(self.page)
+        super().will_unmount()
+
+    def _on_change_message(self, topic, message):
+        """Applies a change feed message that touches this user's debts and repaints."""
+        if message.get("reload"):
+            self.open_debts = self.controller.get_open_debts(self.user_id)
+        elif not self.controller.apply_debt_events(self.open_debts, self.user_id, message.get("registros", [])):
+            return
+        self.data = self.controller.summarize_debts(self.open_debts)
+        self._build_ui()
+        self.page.update()
+
     def _build_ui(self):
         # --- Header ---
         bt_logout = ft.IconButton(
@@ -0,0 +1,45 @@
+import os
+import threading
+
+# Janela (ms) em que digitações consecutivas são agrupadas em uma única pesquisa
+SEARCH_DEBOUNCE_MS = int(os.getenv("SEARCH_DEBOUNCE_MS", 300))
+
+class Debouncer:
+    """
+    Coalesces rapid calls (e.g. keystrokes) into one call after a quiet window.
+
+    Every call cancels the pending timer and bumps a generation counter.
+    The target receives an ``is_stale()`` callable: a search that was already
+    running when a newer keystroke arrived can check it before rendering and
+    drop its result, so only the latest search reaches the page.
+    """
+    def __init__(self, wait_ms: int = SEARCH_DEBOUNCE_MS):
+        self.wait = wait_ms / 1000
+        self._lock = threading.Lock()
+        self._timer = None
+        self._generation = 0
+
+    def __call__(self, fn, *args):
+        """Schedules fn(*args, is_stale) to run after the quiet window."""
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+            if self._timer:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.wait, self._run, (generation, fn, args))
+            self._timer.daemon = True
+            self._timer.start()
+
+    def cancel(self):
+        """Drops the pending call and marks any in-flight one as stale."""
+        with self._lock:
+            self._generation += 1
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+
+    def _run(self, generation, fn, args):
+        is_stale = lambda: generation != self._generation
+        if is_stale():
+            return
+        fn(*args, is_stale)
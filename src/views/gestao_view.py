@@ -1,6 +1,20 @@
+import os
+import threading
 import flet as ft
 from datetime import datetime, timedelta
-from controllers.gestao_controller import GestaoController
+from controllers.gestao_controller import GestaoController, PAGE_SIZE
+from views.debouncer import Debouncer
+from database import change_feed
+
+# Max rows kept loaded per list (bounds memory per session); past it the list asks for a narrower search
+LIST_MAX_ROWS = int(os.getenv("LIST_MAX_ROWS", 1000))
+
+# Build the other tabs in the background right after the first paint (0 = only on first selection)
+PREFETCH_TABS = os.getenv("PREFETCH_TABS", "1") != "0"
+
+# Tab index holding each paged list
+LIST_TABS = {"usuarios": 0, "divida": 1, "entrada": 2, "relatorio": 3}
+REPORTS_TAB = LIST_TABS["relatorio"]
 
 class GestaoView(ft.Column):
     """
@@ -13,6 +27,37 @@ class GestaoView(ft.Column):
         self.page = page
         self.controller = controller
         self.expand = True
+
+        # Paging state for the lists (usuarios, divida, entrada, relatorio)
+        self.list_totals = {}
+        self.loading_pages = set()
+        self.list_hints = {}
+        self.report_filters = {}
+
+        # Writes only mark the Relatórios tab stale; it reloads when shown
+        self.reports_stale = False
+
+        # Keyed card cache per list: {id: (version, control)}. Unchanged cards are
+        # reused, so Flet only sends the inserted/removed/changed ones.
+        self.card_cache = {"usuarios": {}, "divida": {}, "entrada": {}, "relatorio": {}}
+
+        # Page loads (action threads) and change feed patches (pubsub thread) are
+        # serialized; a new row is counted in the list total once
+        self.changes_lock = threading.RLock()
+        self.counted_new_ids = {"usuarios": set(), "divida": set(), "entrada": set()}
+
+        # Tabs are built (and load their data) on first selection; see _ensure_tab.
+        # built_tabs: claimed for building (its loads may run); ready_tabs: content on screen
+        self.built_tabs = set()
+        self.ready_tabs = set()
+        self.tabs_lock = threading.Lock()
+
+        # Debounced live search (one per search field)
+        self.search_debouncers = {
+            "usuarios": Debouncer(),
+            "divida": Debouncer(),
+            "entrada": Debouncer(),
+        }
         
         # UI Setup
         self._build_ui()
@@ -25,6 +70,13 @@ class GestaoView(ft.Column):
         )
         self.page.overlay.append(self.date_picker)
 
+        # File picker for CSV/XLSX imports
+        self.import_picker = ft.FilePicker(
+            on_result=self._on_import_picked,
+            on_upload=self._on_import_upload
+        )
+        self.page.overlay.append(self.import_picker)
+
     # ==========================
     # Helpers
     # ==========================
@@ -35,9 +87,20 @@ class GestaoView(ft.Column):
         self.page.snack_bar.open = True
         self.page.update()
 
-    def _close_dialog(self):
-        """Closes the currently open dialog."""
-        self.page.close(self.dialog)
+    def _close_dialog(self, update=True):
+        """
+        Closes the currently open dialog.
+
+        With update=False the dialog is only flagged closed, so the page.update()
+        of the action that follows (show_message) repaints everything at once.
+        """
+        if not getattr(self, 'dialog', None):
+            return
+        if update:
+            self.page.close(self.dialog)
+        else:
+            self.dialog.open = False
+        self.dialog = None
 
     def _on_date_change(self, e):
         """Handles DatePicker selection updates."""
@@ -66,7 +129,7 @@ class GestaoView(ft.Column):
             height=40,
             content_padding=10,
             expand=True,
-            on_change=lambda e: self.update_usuarios_table() # Live search
+            on_change=lambda e: self.search_debouncers["usuarios"](self.update_usuarios_table) # Live search
         )
         
         bt_new_user = ft.Row(
@@ -85,17 +148,15 @@ class GestaoView(ft.Column):
             alignment=ft.MainAxisAlignment.START
         )
 
-        # List Container
-        self.users_column = ft.Column(spacing=10, scroll=ft.ScrollMode.ADAPTIVE, expand=True)
-        
-        # Initial Load
-        self.update_usuarios_table()
+        # List Container (virtualized, paged on scroll)
+        self.users_column = self._build_paged_list("usuarios")
 
         return ft.Container(
             content=ft.Column([
                 bt_new_user,
                 ft.Container(height=20),
-                self.users_column
+                self.users_column,
+                self.list_hints["usuarios"]
             ], expand=True), # Expand outer column so scrolling works if needed
             padding=20,
             expand=True
@@ -111,7 +172,7 @@ class GestaoView(ft.Column):
             border_width=0,
             height=40,
             content_padding=10,
-            on_change=lambda e: self.update_dividas_table(),
+            on_change=lambda e: self.search_debouncers["divida"](self._load_page, "divida", True),
             expand=True
         )
         
@@ -125,21 +186,21 @@ class GestaoView(ft.Column):
                     color=ft.Colors.WHITE,
                     on_click=lambda e: self._show_action_dialog("nova_divida_tab", None)
                 ),
+                self._build_import_button(),
                 ft.Container(width=20),
                 ft.Container(content=self.search_dividas, width=350, border_radius=20)
             ],
             alignment=ft.MainAxisAlignment.START
         )
 
-        self.dividas_column = ft.Column(spacing=10, scroll=ft.ScrollMode.ADAPTIVE, expand=True)
-        
-        self.update_dividas_table()
+        self.dividas_column = self._build_paged_list("divida")
 
         return ft.Container(
             content=ft.Column([
                 bt_new_divida,
                 ft.Container(height=20),
-                self.dividas_column
+                self.dividas_column,
+                self.list_hints["divida"]
             ], expand=True),
             padding=20,
             expand=True
@@ -155,7 +216,7 @@ class GestaoView(ft.Column):
             border_width=0,
             height=40,
             content_padding=10,
-            on_change=lambda e: self.update_entradas_table(),
+            on_change=lambda e: self.search_debouncers["entrada"](self._load_page, "entrada", True),
             expand=True
         )
         
@@ -168,26 +229,57 @@ class GestaoView(ft.Column):
                     color=ft.Colors.WHITE,
                     on_click=lambda e: self._show_action_dialog("nova_entrada_tab", None)
                 ),
+                self._build_import_button(),
                 ft.Container(width=20),
                 ft.Container(content=self.search_entradas, width=350, border_radius=20)
             ],
             alignment=ft.MainAxisAlignment.START
         )
 
-        self.entradas_column = ft.Column(spacing=10, scroll=ft.ScrollMode.ADAPTIVE, expand=True)
-        
-        self.update_entradas_table()
+        self.entradas_column = self._build_paged_list("entrada")
 
         return ft.Container(
             content=ft.Column([
                 bt_new_entrada,
                 ft.Container(height=20),
-                self.entradas_column
+                self.entradas_column,
+                self.list_hints["entrada"]
             ], expand=True),
             padding=20,
             expand=True
         )
 
+    def _build_import_button(self):
+        """Button that opens the CSV/XLSX import file picker."""
+        return ft.IconButton(
+            ft.Icons.UPLOAD_FILE,
+            icon_color=ft.Colors.BLUE,
+            tooltip="Importar CSV/XLSX (cpf, tipo, categoria, valor, data, data_prevista)",
+            on_click=lambda e: self.import_picker.pick_files(
+                dialog_title="Importar registros",
+                allowed_extensions=["csv", "xlsx"]
+            )
+        )
+
+    def _on_import_picked(self, e):
+        """Imports the picked file directly (desktop) or uploads it first (web)."""
+        if not e.files:
+            return
+        picked = e.files[0]
+        if picked.path:
+            self.controller.import_transactions(picked.path)
+            return
+        self.import_picker.upload([
+            ft.FilePickerUploadFile(picked.name, upload_url=self.page.get_upload_url(picked.name, 600))
+        ])
+
+    def _on_import_upload(self, e):
+        """Runs the import once the browser upload completes."""
+        if e.error:
+            self.show_message(f"Erro no envio do arquivo: {e.error}", ft.Colors.RED)
+        elif e.progress == 1:
+            self.controller.import_uploaded_file(e.file_name)
+
     def _deprecated_build_relatorios_tab(self):
         """Builds the Reports Tab with Filters."""
         # Filtros (Refactoring)
@@ -338,7 +430,7 @@ class GestaoView(ft.Column):
         """Builds the Reports Tab with Filters in a Dialog and Responsive List."""
         
         # Initialize Filter Controls (kept in memory, visible in dialog)
-        users = self.controller.get_usuarios()
+        users = self.controller.get_user_directory()
         user_opts = [ft.dropdown.Option(key="", text="Todos")] + [
             ft.dropdown.Option(key=u['cpf'], text=f"{u['nome']} ({u['cpf']})") for u in users
         ]
@@ -422,11 +514,8 @@ class GestaoView(ft.Column):
         # Metrics Container
         self.metrics_container = ft.Row(wrap=True, spacing=20)
         
-        # Report List (Replaces DataTable)
-        self.report_list = ft.Column(scroll=ft.ScrollMode.AUTO, expand=True)
-        
-        # Initial Load
-        self.update_reports()
+        # Report List (Replaces DataTable; virtualized, paged on scroll)
+        self.report_list = self._build_paged_list("relatorio")
 
         # Build UI
         return ft.Container(
@@ -434,6 +523,11 @@ class GestaoView(ft.Column):
                 ft.Row([
                     ft.Text("Métricas", size=20, weight=ft.FontWeight.BOLD),
                     ft.Container(expand=True),
+                    ft.OutlinedButton(
+                        "Fechamento",
+                        icon=ft.Icons.LOCK_CLOCK,
+                        on_click=lambda e: self._show_fechamento_dialog()
+                    ),
                     ft.ElevatedButton(
                         "Filtros",
                         icon=ft.Icons.FILTER_LIST,
@@ -449,10 +543,10 @@ class GestaoView(ft.Column):
                     content=self.report_list,
                     expand=True,
                     padding=ft.padding.only(bottom=20)
-                ) 
+                ),
+                self.list_hints["relatorio"]
             ],
-            expand=True,
-            scroll=ft.ScrollMode.ALWAYS,
+            expand=True, # The ListView scrolls itself (needs a bounded height, so no outer scroll)
             ),
         padding=20,
         expand=True
@@ -499,6 +593,81 @@ class GestaoView(ft.Column):
         )
         self.page.open(self.filter_dialog)
 
+    def _show_fechamento_dialog(self):
+        """Period close: records dated up to the close date become read-only."""
+        ultimo = self.controller.get_ultimo_fechamento()
+        ultimo_texto = datetime.strptime(ultimo, "%Y-%m-%d").strftime("%d/%m/%Y") if ultimo else "nenhum"
+
+        # Default: last day of the previous month
+        fim_mes_anterior = datetime.now().replace(day=1) - timedelta(days=1)
+        self.fechamento_data = ft.TextField(
+            label="Fechar até",
+            read_only=True,
+            value=fim_mes_anterior.strftime("%Y-%m-%d"),
+            suffix=ft.IconButton(
+                icon=ft.Icons.CALENDAR_MONTH,
+                on_click=lambda e: self.page.open(self.fechamento_date_picker)
+            )
+        )
+        if not hasattr(self, 'fechamento_date_picker'):
+            self.fechamento_date_picker = ft.DatePicker(
+                on_change=lambda e: self._on_fechamento_date_change(e),
+                first_date=datetime(2020, 1, 1),
+                last_date=datetime(2030, 12, 31)
+            )
+            self.page.overlay.append(self.fechamento_date_picker)
+
+        actions = [
+            ft.ElevatedButton(
+                "Fechar período",
+                icon=ft.Icons.LOCK,
+                bgcolor=ft.Colors.BLUE,
+                color=ft.Colors.WHITE,
+                on_click=lambda e: self._confirm_fechamento()
+            )
+        ]
+        if ultimo:
+            actions.append(ft.OutlinedButton(
+                "Reabrir último",
+                icon=ft.Icons.LOCK_OPEN,
+                on_click=lambda e: self._confirm_reabertura()
+            ))
+        actions.append(ft.TextButton("Cancelar", on_click=lambda e: self._close_dialog()))
+
+        self.dialog = ft.AlertDialog(
+            content=ft.Container(
+                content=ft.Column([
+                    ft.Text("Fechamento de Período", size=20, weight=ft.FontWeight.BOLD, color=ft.Colors.BLUE),
+                    ft.Divider(),
+                    ft.Text(f"Último fechamento: {ultimo_texto}"),
+                    ft.Text(
+                        "Dívidas e entradas com data até o fechamento não poderão ser criadas, alteradas ou removidas.",
+                        size=12, color=ft.Colors.GREY
+                    ),
+                    self.fechamento_data,
+                ], tight=True),
+                width=min(self.page.width - 20, 500) if self.page.width else 500,
+                padding=10
+            ),
+            actions=actions,
+            modal=True,
+            actions_alignment=ft.MainAxisAlignment.END
+        )
+        self.page.open(self.dialog)
+
+    def _on_fechamento_date_change(self, e):
+        self.fechamento_data.value = self.fechamento_date_picker.value.strftime("%Y-%m-%d")
+        self.page.update()
+
+    def _confirm_fechamento(self):
+        data = self.fechamento_data.value
+        self._close_dialog(update=False)
+        self.controller.fechar_periodo(data)
+
+    def _confirm_reabertura(self):
+        self._close_dialog(update=False)
+        self.controller.reabrir_periodo()
+
     def _apply_filters_and_close(self):
         self.update_reports()
         if hasattr(self, 'filter_dialog'):
@@ -552,7 +721,8 @@ class GestaoView(ft.Column):
             bgcolor=bg_color,
             border_radius=8,
             border=ft.border.only(left=ft.BorderSide(5, color)),
-            margin=ft.margin.only(bottom=10)
+            margin=ft.margin.only(bottom=10),
+            data=t['id'] # Card key (keyed reconciliation)
         )
 
     def _build_metric_card(self, title, value, color):
@@ -613,7 +783,8 @@ class GestaoView(ft.Column):
             bgcolor=ft.Colors.WHITE,
             border_radius=10,
             shadow=ft.BoxShadow(blur_radius=5, color=ft.Colors.BLACK12),
-            margin=ft.margin.only(bottom=5)
+            margin=ft.margin.only(bottom=5),
+            data=u['id'] # Card key (apply_changes)
         )
 
     def _build_transaction_card(self, d, type_t):
@@ -690,6 +861,7 @@ class GestaoView(ft.Column):
             shadow=ft.BoxShadow(blur_radius=5, color=ft.Colors.BLACK12),
             margin=ft.margin.only(bottom=5),
             width=800,
+            data=d['id'], # Card key (apply_changes)
             #height=120 # Fixed height for consistency or Auto if removed
         )
 
@@ -724,49 +896,311 @@ class GestaoView(ft.Column):
                     'tooltip': 'Excluir Cadastro'
                 }
 
-    def update_usuarios_table(self):
-        """Refreshes the User Management list."""
-        users = self.controller.get_usuarios()
-        search = self.search_field.value.lower() if hasattr(self, 'search_field') and self.search_field.value else ""
-        
-        self.users_column.controls.clear()
-        
-        for u in users:
-            if search and (search not in u['cpf'].lower() and search not in u['nome'].lower()):
-                continue
-            
-            self.users_column.controls.append(self._build_user_card(u))
-
-        self.page.update()
+    def update_usuarios_table(self, is_stale=None):
+        """Refreshes the User Management list (first page; more pages load on scroll)."""
+        self._load_page("usuarios", reset=True, is_stale=is_stale)
 
     def deprecate_update_dividas_table(self):
         """Refreshes the Debts table."""
         data = self.controller.get_dividas(self.search_dividas.value if hasattr(self, 'search_dividas') else "")
     def update_dividas_table(self):
-        """Refreshes the Debts list."""
-        data = self.controller.get_dividas(self.search_dividas.value if hasattr(self, 'search_dividas') else "")
-        self.dividas_column.controls.clear()
-        
-        for d in data:
-            self.dividas_column.controls.append(self._build_transaction_card(d, "divida"))
-            
-        self.page.update()
+        """Refreshes the Debts list (first page; more pages load on scroll)."""
+        self._load_page("divida", reset=True)
 
     def deprecate_update_entradas_table(self):
         """Refreshes the Payments table."""
         data = self.controller.get_entradas(self.search_entradas.value if hasattr(self, 'search_entradas') else "")
     def update_entradas_table(self):
-        """Refreshes the Payments list."""
-        data = self.controller.get_entradas(self.search_entradas.value if hasattr(self, 'search_entradas') else "")
-        self.entradas_column.controls.clear()
-        
-        for d in data:
-            self.entradas_column.controls.append(self._build_transaction_card(d, "entrada"))
-            
+        """Refreshes the Payments list (first page; more pages load on scroll)."""
+        self._load_page("entrada", reset=True)
+
+    # ==========================
+    # Paged Lists
+    # ==========================
+
+    def _build_paged_list(self, list_key):
+        """
+        Builds a virtualized list: Flet only builds the visible items and the data
+        comes a page at a time from the controller as the list is scrolled. Cards
+        have variable height (wrapping rows), so each item is measured on its own
+        (no first_item_prototype).
+        """
+        self.list_hints[list_key] = ft.Text(size=12, color=ft.Colors.GREY, italic=True, visible=False)
+        return ft.ListView(
+            spacing=10,
+            expand=True,
+            build_controls_on_demand=True,
+            on_scroll_interval=200,
+            on_scroll=lambda e: self._on_list_scroll(e, list_key)
+        )
+
+    def _list_source(self, list_key):
+        """Returns (list control, fetch(offset, limit) -> (items, total), card builder) of a paged list."""
+        if list_key == "usuarios":
+            search = self.search_field.value if hasattr(self, 'search_field') else ""
+            return (
+                self.users_column,
+                lambda offset, limit: self.controller.get_usuarios(search or "", offset=offset, limit=limit),
+                self._build_user_card
+            )
+        if list_key == "relatorio":
+            return (
+                self.report_list,
+                lambda offset, limit: self.controller.get_filtered_transactions(offset=offset, limit=limit, **self.report_filters),
+                self._build_report_item
+            )
+        if list_key == "divida":
+            column, search, fetch = self.dividas_column, getattr(self, 'search_dividas', None), self.controller.get_dividas
+        else:
+            column, search, fetch = self.entradas_column, getattr(self, 'search_entradas', None), self.controller.get_entradas
+        term = search.value if search and search.value else ""
+        return (
+            column,
+            lambda offset, limit: fetch(term, offset=offset, limit=limit),
+            lambda d: self._build_transaction_card(d, list_key)
+        )
+
+    def _page_limit(self, offset):
+        """Size of the page starting at offset (never past LIST_MAX_ROWS)."""
+        return max(min(PAGE_SIZE, LIST_MAX_ROWS - offset), 1)
+
+    def _load_page(self, list_key, reset=False, is_stale=None, page_data=None, update=True):
+        """
+        Loads the first page (reset) or appends the next page of a list.
+
+        page_data: (items, total) already fetched by the caller (e.g. concurrently).
+        update=False leaves the page.update() to the caller (tab builds).
+        """
+        if LIST_TABS[list_key] not in self.built_tabs:
+            return # Tab not built yet; it loads when first shown
+        column, fetch, build = self._list_source(list_key)
+
+        offset = 0 if reset else len(column.controls)
+        data, total = page_data or fetch(offset, self._page_limit(offset))
+        if is_stale and is_stale():
+            return # A newer search was typed meanwhile
+
+        # Same structures the change feed patches (pubsub thread): one writer at a time
+        with self.changes_lock:
+            self.list_totals[list_key] = total
+            if reset:
+                self.counted_new_ids.get(list_key, set()).clear() # Now part of the total
+                self._reconcile_cards(column, list_key, data, build)
+            else:
+                column.controls.extend(self._keyed_card(list_key, d, build) for d in data)
+            self._update_list_hint(list_key, column)
+
+        if update:
+            self.page.update()
+
+    def _on_list_scroll(self, e, list_key):
+        """Loads the next page when the list is scrolled near its end."""
+        column = self._list_source(list_key)[0]
+        if e.pixels < e.max_scroll_extent - 200:
+            return
+        # Check-and-claim in one step: quick scroll events must not load the same page twice
+        with self.changes_lock:
+            loaded = len(column.controls)
+            if loaded >= self.list_totals.get(list_key, 0) or loaded >= LIST_MAX_ROWS or list_key in self.loading_pages:
+                return
+            self.loading_pages.add(list_key)
+        try:
+            self._load_page(list_key)
+        finally:
+            with self.changes_lock:
+                self.loading_pages.discard(list_key)
+
+    def _update_list_hint(self, list_key, column):
+        """Shows 'N de M' under a list that reached LIST_MAX_ROWS."""
+        hint = self.list_hints.get(list_key)
+        if not hint:
+            return
+        loaded, total = len(column.controls), self.list_totals.get(list_key, 0)
+        hint.visible = loaded >= LIST_MAX_ROWS and total > loaded
+        hint.value = f"Mostrando {loaded} de {total}. Refine a pesquisa para ver os demais."
+
+    def apply_changes(self, changes):
+        """
+        Patches the lists after a write, given its ChangeSet.
+
+        Only the cards of the affected users/records are rebuilt (or removed/added);
+        the Relatórios tab is marked stale. The caller does the single page.update().
+        """
+        users = []
+        if LIST_TABS["usuarios"] in self.ready_tabs and changes.user_ids:
+            users = self.controller.get_usuarios_by_ids(changes.user_ids)
+        records = self.controller.get_transactions(changes.record_ids) if changes.record_ids else []
+
+        with self.changes_lock:
+            self._patch_users({u['id']: u for u in users}, changes.new_user_ids, changes.removed_user_ids)
+            self._patch_transactions(records, changes.new_record_ids, changes.removed_record_ids)
+            self.reports_stale = True
+
+    def _patch_users(self, users, new_ids, removed_ids):
+        if LIST_TABS["usuarios"] in self.ready_tabs and (users or removed_ids):
+            self._patch_cards(
+                self.users_column,
+                "usuarios",
+                users,
+                removed_ids,
+                new_ids,
+                self._build_user_card,
+                self._user_matches_search
+            )
+
+    def _patch_transactions(self, records, new_ids, removed_ids):
+        if not records and not removed_ids:
+            return
+        for type_t, type_str in (("divida", 'DEBT'), ("entrada", 'PAYMENT')):
+            if LIST_TABS[type_t] not in self.ready_tabs:
+                continue # Loads with fresh data when first shown
+            column = self._list_source(type_t)[0]
+            self._patch_cards(
+                column,
+                type_t,
+                {d['id']: d for d in records if d['type'] == type_str},
+                removed_ids,
+                new_ids,
+                lambda d, type_t=type_t: self._build_transaction_card(d, type_t),
+                lambda d, type_t=type_t: self._transaction_matches_search(d, type_t)
+            )
+
+    def _on_change_message(self, topic, message):
+        """
+        Applies a change feed message (a write made in any session, of any process).
+
+        The events carry the new row/balance values, so the cards are patched
+        without querying the database (names come from the process caches).
+        Messages of this session's own writes are skipped: apply_changes (or the
+        import's reload) already painted them.
+        """
+        if message.get("session") == self.controller.session_id:
+            return
+        if message.get("reload"):
+            # Too big to describe (import) or notifications were missed: reload what is on screen
+            self.reports_stale = True
+            for list_key, update in (("usuarios", self.update_usuarios_table),
+                                     ("divida", self.update_dividas_table),
+                                     ("entrada", self.update_entradas_table)):
+                if LIST_TABS[list_key] in self.ready_tabs:
+                    update()
+            return
+
+        registros = message.get("registros", [])
+        if not registros and not message.get("usuarios"):
+            return # Cache invalidation only
+        records = self.controller.transactions_from_events([e for e in registros if not e["deleted"]])
+
+        with self.changes_lock:
+            users = {}
+            cache = self.card_cache["usuarios"]
+            for event in message.get("usuarios", []):
+                if event["deleted"]:
+                    continue
+                cached = cache.get(event["id"])
+                if cached:
+                    user = dict(cached[0])
+                elif event["created"]:
+                    user = self.controller.user_from_event(event)
+                else:
+                    continue # Not on screen: it loads with fresh data on scroll/search
+                user.update({k: event[k] for k in ("cpf", "nome") if k in event})
+                user.update(event.get("balance", {}))
+                users[event["id"]] = user
+
+            usuarios = message.get("usuarios", [])
+            self._patch_users(
+                users,
+                {e["id"] for e in usuarios if e["created"]},
+                {e["id"] for e in usuarios if e["deleted"]}
+            )
+            self._patch_transactions(
+                records,
+                {e["id"] for e in registros if e["created"]},
+                {e["id"] for e in registros if e["deleted"]}
+            )
+            self.reports_stale = True
         self.page.update()
 
-    def update_reports(self):
+    def _keyed_card(self, list_key, item, build):
+        """Returns the cached card of item if its data did not change, else builds (and caches) a new one."""
+        cache = self.card_cache[list_key]
+        version = tuple(item.items())
+        cached = cache.get(item['id'])
+        if cached and cached[0] == version:
+            return cached[1]
+        card = build(item)
+        cache[item['id']] = (version, card)
+        return card
+
+    def _reconcile_cards(self, column, list_key, items, build):
+        """
+        Sets the list to the cards of items, reusing the cached controls of unchanged ones.
+
+        The cache is pruned to the ids shown, so it never outgrows the list itself.
+        """
+        with self.changes_lock:
+            column.controls[:] = [self._keyed_card(list_key, item, build) for item in items]
+            shown = {item['id'] for item in items}
+            cache = self.card_cache[list_key]
+            for stale_id in cache.keys() - shown:
+                del cache[stale_id]
+
+    def _patch_cards(self, column, list_key, items, removed_ids, new_ids, build, matches):
+        """
+        Replaces/removes/appends cards (keyed by control.data) in a paged list.
+
+        A new row (in new_ids) is only appended once every page is loaded; otherwise
+        it just counts in the total and arrives on scroll (the lists are ordered by
+        id, so new rows always sort last). Other rows that are not on screen are
+        simply not loaded yet and are left alone.
+        """
+        if removed_ids:
+            kept = [c for c in column.controls if c.data not in removed_ids]
+            self.list_totals[list_key] = self.list_totals.get(list_key, 0) - (len(column.controls) - len(kept))
+            column.controls[:] = kept
+            for removed_id in removed_ids:
+                self.card_cache[list_key].pop(removed_id, None)
+
+        index = {c.data: i for i, c in enumerate(column.controls)}
+        counted = self.counted_new_ids[list_key]
+        for item_id, item in items.items():
+            if item_id in index:
+                column.controls[index[item_id]] = self._keyed_card(list_key, item, build)
+            elif item_id in new_ids and item_id not in counted and matches(item):
+                if len(column.controls) >= self.list_totals.get(list_key, 0):
+                    column.controls.append(self._keyed_card(list_key, item, build))
+                self.list_totals[list_key] = self.list_totals.get(list_key, 0) + 1
+                counted.add(item_id)
+        self._update_list_hint(list_key, column)
+
+    def _user_matches_search(self, u):
+        search = self.search_field.value.lower() if hasattr(self, 'search_field') and self.search_field.value else ""
+        return not search or search in u['cpf'].lower() or search in u['nome'].lower()
+
+    def _transaction_matches_search(self, d, type_t):
+        field = getattr(self, 'search_dividas' if type_t == "divida" else 'search_entradas', None)
+        search = field.value.lower() if field and field.value else ""
+        return not search or any(search in (d[k] or "").lower() for k in ('cpf', 'nome', 'categoria'))
+
+    def _on_tab_change(self, e):
+        """Builds a tab on its first selection; reloads Relatórios if writes marked it stale."""
+        index = self.tabs.selected_index
+        if self._ensure_tab(index):
+            return
+        if index == REPORTS_TAB and index in self.ready_tabs and self.reports_stale:
+            self.update_reports()
+
+    def update_reports(self, update=True):
         """Refreshes Metrics and Report Table with applied filters."""
+        if REPORTS_TAB not in self.built_tabs:
+            return # Loads with fresh data when first shown
+        self._run_loads(self._tab_loads(REPORTS_TAB))
+        if update:
+            self.page.update()
+
+    def _read_report_filters(self):
+        """Current values of the report filter controls (None where empty or invalid)."""
         from datetime import datetime as dt
         
         # Coletar valores dos filtros
@@ -797,15 +1231,15 @@ class GestaoView(ft.Column):
             except ValueError:
                 data_final = None
         
-        # Atualizar métricas com filtros
-        metrics = self.controller.get_metrics(
-            user_cpf=user_cpf,
-            data_inicial=data_inicial,
-            data_final=data_final,
-            categoria=categoria,
-            tipo=tipo
-        )
-        
+        return {
+            "user_cpf": user_cpf,
+            "data_inicial": data_inicial,
+            "data_final": data_final,
+            "categoria": categoria,
+            "tipo": tipo,
+        }
+
+    def _show_metrics(self, metrics):
         self.metrics_container.controls = [
             self._build_metric_card("Total Dívidas", f"R$ {metrics['total_dividas']:.2f}", ft.Colors.RED_400),
             self._build_metric_card("Total Entradas", f"R$ {metrics['total_entradas']:.2f}", ft.Colors.GREEN_400),
@@ -813,19 +1247,6 @@ class GestaoView(ft.Column):
             self._build_metric_card("Maior Entrada", f"R$ {metrics['maior_entrada']:.2f}", ft.Colors.BLUE_400),
         ]
 
-        # Atualizar tabela com transações filtradas
-        transactions = self.controller.get_filtered_transactions(
-            user_cpf=user_cpf,
-            data_inicial=data_inicial,
-            data_final=data_final,
-            categoria=categoria,
-            tipo=tipo
-        )
-        
-        
-        self.report_list.controls = [self._build_report_item(t) for t in transactions]
-        self.page.update()
-
     # ==========================
     # Dialog Builders & Actions
     # ==========================
@@ -861,7 +1282,7 @@ class GestaoView(ft.Column):
              valor_float = float(user_data.get('valor', 0))
              valor = f"R$ {valor_float:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
              
-             recibo_control = self.controller.criar_recibo(nome, cpf, valor)
+             recibo_control = self.controller.criar_recibo(nome, cpf, valor, user_data.get('id'))
              
              self.dialog = ft.AlertDialog(
                 content=ft.Container(content=recibo_control, padding=10),
@@ -953,7 +1374,7 @@ class GestaoView(ft.Column):
        
         # Logic to populate fields
         if is_transaction_mode:
-            users = self.controller.get_usuarios()
+            users = self.controller.get_user_directory()
             opts = [ft.dropdown.Option(key=u['cpf'], text=f"{u['nome']} ({u['cpf']})") for u in users]
             self.nu_user_dropout.options = opts
             
@@ -1114,7 +1535,7 @@ class GestaoView(ft.Column):
         self.et_type = transaction_type
         
         # User Selector (Dropdown)
-        users = self.controller.get_usuarios()
+        users = self.controller.get_user_directory()
         opts = [ft.dropdown.Option(key=u['cpf'], text=f"{u['nome']} ({u['cpf']})") for u in users]
         
         self.et_user_dropdown = ft.Dropdown(
@@ -1302,12 +1723,11 @@ class GestaoView(ft.Column):
             "data_prevista": self.nu_data_prevista.value if (not self.nu_is_pago.value) else None
         }
         
+        self._close_dialog(update=False)
         if self.is_adding_transaction:
             self.controller.add_transaction(data)
         else:
             self.controller.add_usuario(data)
-            
-        self._close_dialog()
 
     def _clear_edit_user_form(self, e):
         self.eu_nome.value = self.eu_original_data['nome']
@@ -1324,8 +1744,8 @@ class GestaoView(ft.Column):
             "nome": self.eu_nome.value,
             "senha": self.eu_senha.value
         }
+        self._close_dialog(update=False)
         self.controller.update_usuario(data)
-        self._close_dialog()
 
     def _save_edit_transaction(self, e):
          
@@ -1343,27 +1763,16 @@ class GestaoView(ft.Column):
              # Also need to pass data_prevista if editing
              "data_prevista": self.et_data_prevista.value if hasattr(self, 'et_data_prevista') and self.et_data_prevista.visible else None
          }
+         self._close_dialog(update=False)
          self.controller.update_transaction(data, self.et_type)
-         self._close_dialog()
 
     def _confirm_delete_user(self, cpf):
+        self._close_dialog(update=False)
         self.controller.delete_usuario(cpf)
-        self._close_dialog()
 
     def _confirm_delete_transaction(self, id):
+        self._close_dialog(update=False)
         self.controller.delete_transaction(id)
-        self._close_dialog()
-    
-    def _close_dialog(self):
-        """Fecha o diálogo aberto e atualiza as tabelas."""
-        if hasattr(self, 'dialog') and self.dialog:
-            self.page.close(self.dialog)
-            self.dialog = None
-        self.update_usuarios_table()
-        self.update_dividas_table()
-        self.update_entradas_table()
-        self.update_reports()
-        self.page.update()
     
     # ==========================
     # Filter Methods
@@ -1421,7 +1830,13 @@ class GestaoView(ft.Column):
             shadow=ft.BoxShadow(blur_radius=5, color=ft.Colors.with_opacity(0.1, ft.Colors.BLACK))
         )
 
-        # Tabs
+        # Tabs (only Usuários is built up front; the rest on first selection/prefetch)
+        self.tab_builders = [
+            self._build_usuarios_tab,
+            self._build_dividas_tab,
+            self._build_entradas_tab,
+            self._build_relatorios_tab,
+        ]
         self.tabs = ft.Tabs(
             selected_index=0,
             animation_duration=300,
@@ -1429,32 +1844,142 @@ class GestaoView(ft.Column):
             label_color=ft.Colors.BLUE,
             unselected_label_color=ft.Colors.BLUE_200,
             divider_color=ft.Colors.TRANSPARENT,
+            on_change=self._on_tab_change,
             tabs=[
                 ft.Tab(
                     text="Usuários",
                     icon=ft.Icons.PEOPLE,
-                    content=self._build_usuarios_tab(),
+                    content=self._build_tab_placeholder(),
                 ),
                 ft.Tab(
                     text="Dívidas",
                     icon=ft.Icons.MONEY_OFF,
-                    content=self._build_dividas_tab(),
+                    content=self._build_tab_placeholder(),
                 ),
                 ft.Tab(
                     text="Entradas",
                     icon=ft.Icons.ATTACH_MONEY,
-                    content=self._build_entradas_tab(),
+                    content=self._build_tab_placeholder(),
                 ),
                 ft.Tab(
                     text="Relatórios",
                     icon=ft.Icons.ANALYTICS,
-                    content=self._build_relatorios_tab(),
+                    content=self._build_tab_placeholder(),
                 ),
             ],
             expand=True,
         )
+        # Built before the view is mounted: it goes out with the first page.add
+        self._ensure_tab(0, update=False)
 
         self.controls = [
             header,
             self.tabs
         ]
+
+    # ==========================
+    # Lazy Tabs
+    # ==========================
+
+    def _build_tab_placeholder(self):
+        """Content of a tab that was not built yet."""
+        return ft.Container(content=ft.ProgressRing(), alignment=ft.alignment.center, expand=True)
+
+    def _claim_tab(self, index):
+        """Claims tab `index` for building; False if somebody already did."""
+        with self.tabs_lock:
+            if index in self.built_tabs:
+                return False
+            self.built_tabs.add(index) # Before loading: _load_page/update_reports check it
+            return True
+
+    def _release_tabs(self, indexes):
+        """Gives up the claim of tabs whose build failed (the next selection retries)."""
+        with self.tabs_lock:
+            self.built_tabs.difference_update(indexes)
+
+    def _tab_loads(self, index):
+        """
+        Initial reads of a built tab, as [(fetch(), apply(result))].
+
+        The fetches are independent (each opens its own session), so several tabs'
+        loads can run together in one run_concurrently; apply only touches controls.
+        """
+        if index == REPORTS_TAB:
+            self.reports_stale = False
+            # Filtros vigentes (as próximas páginas da lista usam os mesmos)
+            self.report_filters = filters = self._read_report_filters()
+            return [
+                (lambda: self.controller.get_metrics(**filters), self._show_metrics),
+                (lambda: self.controller.get_filtered_transactions(offset=0, limit=self._page_limit(0), **filters),
+                 lambda page_data: self._load_page("relatorio", reset=True, page_data=page_data, update=False)),
+            ]
+        list_key = next(key for key, tab in LIST_TABS.items() if tab == index)
+        fetch = self._list_source(list_key)[1]
+        return [(
+            lambda: fetch(0, self._page_limit(0)),
+            lambda page_data: self._load_page(list_key, reset=True, page_data=page_data, update=False)
+        )]
+
+    def _run_loads(self, loads):
+        """Runs the fetches of _tab_loads concurrently, then applies the results in order."""
+        results = self.controller.run_concurrently([fetch for fetch, _ in loads])
+        for (_, apply), result in zip(loads, results):
+            apply(result)
+
+    def _ensure_tab(self, index, update=True):
+        """
+        Builds tab `index` (and runs its initial load) if nobody claimed it yet.
+
+        Tabs are claimed under tabs_lock but built outside it. A tab selected while
+        the prefetch builds it keeps its placeholder until the prefetch finishes.
+
+        Returns True if the tab was built by this call.
+        """
+        if not self._claim_tab(index):
+            return False
+        try:
+            content = self.tab_builders[index]()
+            self._run_loads(self._tab_loads(index))
+        except Exception:
+            self._release_tabs([index])
+            raise
+        self.tabs.tabs[index].content = content
+        self.ready_tabs.add(index)
+        if update:
+            self.page.update()
+        return True
+
+    def did_mount(self):
+        """Prefetches the other tabs in the background once the first one is on screen."""
+        super().did_mount()
+        # Writes made in other sessions (other admins, imports) patch this one live
+        change_feed.subscribe(self.page, self._on_change_message)
+        if PREFETCH_TABS:
+            self.page.run_thread(self._prefetch_tabs)
+
+    def will_unmount(self):
+        change_feed.unsubscribe(self.page)
+        super().will_unmount()
+
+    def _prefetch_tabs(self):
+        """
+        Builds the remaining tabs and paints them with a single page.update().
+
+        The controls are built here; the initial reads of every tab go to one
+        run_concurrently (each on its own connection), so the wait is the slowest
+        read and no worker thread touches the page.
+        """
+        pending = [i for i in range(len(self.tab_builders)) if self._claim_tab(i)]
+        if not pending:
+            return
+        try:
+            contents = {i: self.tab_builders[i]() for i in pending}
+            self._run_loads([load for i in pending for load in self._tab_loads(i)])
+        except Exception:
+            self._release_tabs(pending)
+            raise
+        for i in pending:
+            self.tabs.tabs[i].content = contents[i]
+            self.ready_tabs.add(i)
+        self.page.update()
@@ -0,0 +1,34 @@
+import os
+import tempfile
+
+# The engine is created on import: point it at a throwaway SQLite file first
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'counts_test.db')}"
+
+import pytest
+from database.config import Base, SessionLocal, engine, seed_basic_data
+from database.models import Usuario
+from repositories.lookup_cache import categorias_cache, classificacoes_cache, user_directory_cache
+
+
+@pytest.fixture
+def db():
+    """Fresh schema with the basic seed plus three users (cpf 00000000001..3)."""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    seed_basic_data()
+    for cache in (categorias_cache, classificacoes_cache, user_directory_cache):
+        cache.invalidate()
+
+    session = SessionLocal()
+    session.add_all([Usuario(cpf=f"{i:011d}", nome=f"Usuário {i}") for i in range(1, 4)])
+    session.commit()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def users(db):
+    """{user_id: cpf} of the test users (the admin is left out)."""
+    return {u.id: u.cpf for u in db.query(Usuario).filter(Usuario.cpf != "00000000000")}
@@ -0,0 +1,169 @@
+import json
+import socket
+import threading
+import time
+
+import pytest
+from database import change_feed
+
+
+def _message(n_registros=200, n_usuarios=30):
+    return {
+        "invalidate": ["categorias"],
+        "session": "s1",
+        "registros": [{"id": i, "pad": "x" * 200} for i in range(n_registros)],
+        "usuarios": [{"id": i, "deleted": False, "balance": {"pendente": 1.5}} for i in range(n_usuarios)],
+    }
+
+
+def test_chunks_stay_under_the_payload_budget():
+    chunks = list(change_feed._chunks(_message()))
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert len(json.dumps(chunk)) <= change_feed.MAX_PAYLOAD
+        envelope = json.dumps({"origin": change_feed.PROCESS_ID, "message": chunk}, separators=(",", ":"))
+        assert len(envelope.encode()) < 8000 # Postgres NOTIFY limit
+
+
+def test_chunks_keep_event_order():
+    message = _message()
+    chunks = list(change_feed._chunks(message))
+    for key in ("registros", "usuarios"):
+        assert [e for chunk in chunks for e in chunk.get(key, [])] == message[key]
+
+
+def test_chunks_put_the_head_in_the_first_chunk_and_the_session_in_all():
+    first, *rest = change_feed._chunks(_message())
+    assert first["invalidate"] == ["categorias"]
+    assert all("invalidate" not in chunk for chunk in rest)
+    assert all(chunk["session"] == "s1" for chunk in [first, *rest])
+
+
+def test_small_or_empty_messages_are_one_chunk():
+    assert list(change_feed._chunks({"reload": True})) == [{"reload": True}]
+    assert list(change_feed._chunks(_message(3, 1))) == [_message(3, 1)]
+
+
+@pytest.fixture
+def feed(monkeypatch):
+    """Isolated sinks/caches; records what is delivered and which caches were dropped."""
+    delivered, dropped = [], []
+    monkeypatch.setattr(change_feed, "_sinks", [delivered.append])
+    monkeypatch.setattr(change_feed, "_caches", {
+        "categorias": lambda: dropped.append("categorias"),
+        "usuarios": lambda: dropped.append("usuarios"),
+    })
+    yield delivered, dropped
+    change_feed.disconnect()
+
+
+def test_on_notify_skips_cache_invalidation_for_its_own_process(feed):
+    delivered, dropped = feed
+    message = {"invalidate": ["categorias"]}
+    change_feed._on_notify(json.dumps({"origin": change_feed.PROCESS_ID, "message": message}))
+    assert dropped == []
+    assert delivered == [message]
+
+    change_feed._on_notify(json.dumps({"origin": "another-process", "message": message}))
+    assert dropped == ["categorias"]
+
+
+def test_on_notify_reload_from_another_process_drops_every_cache(feed):
+    _, dropped = feed
+    change_feed._on_notify(json.dumps({"origin": "another-process", "message": {"reload": True}}))
+    assert sorted(dropped) == ["categorias", "usuarios"]
+
+
+class FakeDriverConnection:
+    """Just enough of a psycopg2 connection for _listen (select/poll/notifies)."""
+    def __init__(self):
+        self._sock, self._peer = socket.socketpair()
+        self._pending = []
+        self.notifies = []
+        self.autocommit = False
+        self.listening = threading.Event()
+
+    def fileno(self):
+        return self._sock.fileno()
+
+    def cursor(self):
+        connection = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, sql):
+                assert sql == f"LISTEN {change_feed.PG_CHANNEL}"
+                connection.listening.set()
+
+        return Cursor()
+
+    def notify(self, payload):
+        self._pending.append(type("Notify", (), {"payload": payload})())
+        self._peer.send(b"n")
+
+    def poll(self):
+        self._sock.setblocking(False)
+        try:
+            self._sock.recv(1024)
+        except BlockingIOError:
+            pass
+        self.notifies.extend(self._pending)
+        self._pending.clear()
+
+    def close(self):
+        self._sock.close()
+        self._peer.close()
+
+
+class FakeRawConnection:
+    def __init__(self):
+        self.driver_connection = FakeDriverConnection()
+        self.closed = False
+
+    def detach(self):
+        pass
+
+    def close(self):
+        self.closed = True
+        self.driver_connection.close()
+
+
+class FakeEngine:
+    dialect = type("Dialect", (), {"name": "postgresql"})()
+
+    def __init__(self):
+        self.raw = FakeRawConnection()
+
+    def raw_connection(self):
+        return self.raw
+
+
+def _wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_listener_delivers_notifies_and_disconnect_stops_it(feed):
+    delivered, _ = feed
+    engine = FakeEngine()
+    assert change_feed.connect(engine)
+    thread = change_feed._listener[0]
+    assert engine.raw.driver_connection.listening.wait(2)
+
+    engine.raw.driver_connection.notify(json.dumps({"origin": "another-process", "message": {"registros": [{"id": 1}]}}))
+    _wait_for(lambda: delivered)
+    assert delivered == [{"registros": [{"id": 1}]}]
+
+    start = time.monotonic()
+    change_feed.disconnect()
+    assert not thread.is_alive()
+    assert time.monotonic() - start < 2 # Woken up, not waiting for the select timeout
+    assert engine.raw.closed
+    assert change_feed._transport is None and change_feed._listener is None
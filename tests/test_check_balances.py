@@ -0,0 +1,75 @@
+from datetime import date
+
+import check_balances
+import rebuild_balances
+from sqlalchemy import update
+from database.models import Registro, Alocacao
+from repositories import balance_engine
+from repositories.fechamento_repository import FechamentoRepository
+from repositories.transaction_repository import RegistroRepository
+
+
+def _history(db, user_id):
+    """Two debts and a payment in January (closed at 31/01), one debt after the close."""
+    repo = RegistroRepository(db)
+    ids = {
+        "jan_debt": repo.create(user_id, "DEBT", "Mensalidade", 100.0, date(2024, 1, 5)).id,
+        "jan_debt_2": repo.create(user_id, "DEBT", "Mensalidade", 50.0, date(2024, 1, 10)).id,
+        "jan_payment": repo.create(user_id, "PAYMENT", "Mensalidade", 120.0, date(2024, 1, 20)).id,
+        "mar_debt": repo.create(user_id, "DEBT", "Mensalidade", 30.0, date(2024, 3, 1)).id,
+    }
+    FechamentoRepository(db).fechar(date(2024, 1, 31))
+    return ids
+
+
+def _corrupt(db, registro_id, saldo, classificacao_id):
+    db.execute(update(Registro).where(Registro.id == registro_id).values(saldo=saldo, classificacao_id=classificacao_id))
+    db.commit()
+
+
+def test_repair_replays_drift_inside_a_closed_period(db, users):
+    user_id = next(iter(users))
+    ids = _history(db, user_id)
+    _corrupt(db, ids["jan_debt"], 100.0, balance_engine.PENDENTE)
+    db.add(Alocacao(payment_id=ids["jan_payment"], debt_id=ids["jan_debt_2"], valor_centavos=999))
+    db.commit()
+
+    _, drifted = check_balances.check(workers=1, chunk_users=500)
+    assert [(u, closed) for u, _, _, closed in drifted] == [(user_id, True)]
+
+    check_balances.repair(drifted, batch=100)
+    assert check_balances.check(workers=1, chunk_users=500)[1] == []
+    db.expire_all()
+    assert db.get(Registro, ids["jan_debt"]).classificacao_id == balance_engine.PAGO
+
+    # Writes after the close still start from the (untouched) checkpoint
+    RegistroRepository(db).create(user_id, "PAYMENT", "Mensalidade", 40.0, date(2024, 3, 5))
+    assert check_balances.check(workers=1, chunk_users=500)[1] == []
+
+
+def test_repair_uses_the_checkpoint_for_drift_after_the_close(db, users):
+    user_id = next(iter(users))
+    ids = _history(db, user_id)
+    _corrupt(db, ids["mar_debt"], 0.0, balance_engine.PAGO)
+
+    _, drifted = check_balances.check(workers=1, chunk_users=500)
+    assert [(u, closed) for u, _, _, closed in drifted] == [(user_id, False)]
+
+    check_balances.repair(drifted, batch=100)
+    assert check_balances.check(workers=1, chunk_users=500)[1] == []
+
+
+def test_repair_rebuilds_the_checkpoint_of_a_fixed_closed_period(db, users):
+    user_id = next(iter(users))
+    ids = _history(db, user_id)
+    # Fixed by hand in the database: the January payment was 200, not 120
+    db.execute(update(Registro).where(Registro.id == ids["jan_payment"]).values(valor=200.0))
+    db.commit()
+
+    _, drifted = check_balances.check(workers=1, chunk_users=500)
+    check_balances.repair(drifted, batch=100)
+    assert rebuild_balances.verify(db) == []
+
+    RegistroRepository(db).create(user_id, "DEBT", "Mensalidade", 10.0, date(2024, 2, 15))
+    assert check_balances.check(workers=1, chunk_users=500)[1] == []
+    assert rebuild_balances.verify(db) == []
@@ -0,0 +1,77 @@
+from datetime import date
+
+import pytest
+from database.models import Usuario, Registro, Categoria, Alocacao, SaldoFechamento, PendenciaFechamento
+from repositories.fechamento_repository import FechamentoRepository
+from repositories.transaction_repository import RegistroRepository, PeriodoFechadoError
+from repositories.user_repository import UsuarioRepository
+
+
+def test_deleting_a_user_with_closed_records_is_refused(db, users):
+    (user_id, cpf), (other_id, other_cpf) = list(users.items())[:2]
+    repo = RegistroRepository(db)
+    repo.create(user_id, "DEBT", "Mensalidade", 100.0, date(2024, 1, 5))
+    repo.create(other_id, "DEBT", "Mensalidade", 50.0, date(2024, 3, 5))
+    FechamentoRepository(db).fechar(date(2024, 1, 31))
+    checkpoint = (db.query(SaldoFechamento).count(), db.query(PendenciaFechamento).count())
+
+    with pytest.raises(PeriodoFechadoError):
+        UsuarioRepository(db).delete(cpf)
+    assert db.get(Usuario, user_id) is not None
+    assert db.query(Registro).filter(Registro.user_id == user_id).count() == 1
+    assert (db.query(SaldoFechamento).count(), db.query(PendenciaFechamento).count()) == checkpoint
+
+    # Only records after the close: the user can go
+    assert UsuarioRepository(db).delete(other_cpf)
+    assert db.get(Usuario, other_id) is None
+
+
+def _snapshot(db):
+    """Every row the writes could touch."""
+    db.expire_all()
+    return [
+        sorted(tuple(row) for row in db.query(*columns))
+        for columns in (
+            (Registro.id, Registro.user_id, Registro.category_id, Registro.valor, Registro.saldo,
+             Registro.classificacao_id, Registro.data_debito, Registro.data_entrada),
+            (Alocacao.payment_id, Alocacao.debt_id, Alocacao.valor_centavos),
+            (Categoria.id, Categoria.categoria),
+            (PendenciaFechamento.registro_id, PendenciaFechamento.valor_centavos),
+            (SaldoFechamento.user_id, SaldoFechamento.category_id, SaldoFechamento.total_entradas_centavos),
+        )
+    ]
+
+
+@pytest.fixture
+def closed(db, users):
+    """January closed (a debt and a partial payment), one debt in March; returns (user_id, ids)."""
+    user_id = next(iter(users))
+    repo = RegistroRepository(db)
+    ids = {
+        "debt": repo.create(user_id, "DEBT", "Mensalidade", 100.0, date(2024, 1, 5)).id,
+        "payment": repo.create(user_id, "PAYMENT", "Mensalidade", 40.0, date(2024, 1, 20)).id,
+        "open_debt": repo.create(user_id, "DEBT", "Mensalidade", 30.0, date(2024, 3, 1)).id,
+    }
+    FechamentoRepository(db).fechar(date(2024, 1, 31))
+    return user_id, ids
+
+
+@pytest.mark.parametrize("write", [
+    lambda repo, user_id, ids: repo.create(user_id, "PAYMENT", "Categoria Nova", 50.0, date(2024, 1, 25)),
+    lambda repo, user_id, ids: repo.update(ids["payment"], amount=100.0),
+    lambda repo, user_id, ids: repo.update(ids["debt"], category="Cantina"),
+    # Moving an open record into the closed period is a write in it as well
+    lambda repo, user_id, ids: repo.update(ids["open_debt"], date_obj=date(2024, 1, 10)),
+    lambda repo, user_id, ids: repo.delete(ids["payment"]),
+    lambda repo, user_id, ids: repo.bulk_create([
+        {"user_id": user_id, "type": "DEBT", "category": "Categoria Nova", "amount": 10.0, "date_obj": date(2024, 4, 1)},
+        {"user_id": user_id, "type": "PAYMENT", "category": "Mensalidade", "amount": 10.0, "date_obj": date(2024, 1, 2)},
+    ]),
+], ids=["create", "update_amount", "update_category", "update_into_close", "delete", "bulk_create"])
+def test_writes_in_a_closed_period_are_refused_and_change_nothing(db, closed, write):
+    user_id, ids = closed
+    before = _snapshot(db)
+
+    with pytest.raises(PeriodoFechadoError):
+        write(RegistroRepository(db), user_id, ids)
+    assert _snapshot(db) == before
@@ -0,0 +1,109 @@
+from datetime import date, datetime
+
+import pytest
+import rebuild_balances
+from sqlalchemy.exc import IntegrityError
+from controllers.gestao_controller import GestaoController
+from database.models import Registro, Categoria
+from repositories.transaction_repository import RegistroRepository
+
+
+def _records(user_ids):
+    """Interleaved debts and payments over several (user, category) pairs, some back-dated."""
+    records = []
+    for i in range(40):
+        records.append({
+            "user_id": user_ids[i % len(user_ids)],
+            "type": "PAYMENT" if i % 3 == 0 else "DEBT",
+            "category": ["Mensalidade", "Cantina", "Uniforme"][i % 3 if i % 2 else 0],
+            "amount": [25.0, 0.1, 12.35, 0.0, 60.0][i % 5],
+            "date_obj": date(2024, 3, 1 + (i * 7) % 28),
+        })
+    return records
+
+
+def test_bulk_create_matches_a_full_replay(db, users):
+    user_ids = list(users)
+    repo = RegistroRepository(db)
+    repo.create(user_ids[0], "DEBT", "Mensalidade", 30.0, date(2024, 2, 1)) # Existing history
+    assert repo.bulk_create(_records(user_ids)) == 40
+    assert db.query(Registro).count() == 41
+    assert db.query(Categoria).filter(Categoria.categoria == "Uniforme").count() == 1
+    assert rebuild_balances.verify(db) == []
+
+
+def test_failing_import_leaves_nothing_behind(db, users):
+    user_ids = list(users)
+    before = db.query(Categoria).count()
+    records = _records(user_ids)
+    records[-1] = dict(records[-1], category="Nova", amount=None) # NOT NULL valor
+
+    with pytest.raises(IntegrityError):
+        RegistroRepository(db).bulk_create(records)
+    assert db.query(Registro).count() == 0
+    assert db.query(Categoria).count() == before
+
+
+def test_failing_category_is_rolled_back(db, users):
+    records = [dict(_records(list(users))[0], category=None)] # NOT NULL categoria, fails on the flush
+
+    with pytest.raises(IntegrityError):
+        RegistroRepository(db).bulk_create(records)
+    # The session was rolled back (no PendingRollbackError) and nothing was written
+    assert db.query(Registro).count() == 0
+
+
+class FakeView:
+    """Records the messages; every other view call is a no-op."""
+    def __init__(self):
+        self.messages = []
+
+    def show_message(self, text, color=None):
+        self.messages.append(text)
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+def _import(path):
+    controller = GestaoController(page=None)
+    controller.set_view(FakeView())
+    controller.import_transactions(str(path))
+    return controller.view.messages
+
+
+def test_csv_import_through_the_controller(db, users, tmp_path):
+    (first, first_cpf), (second, second_cpf) = list(users.items())[:2]
+    path = tmp_path / "import.csv"
+    path.write_text(
+        "CPF;Tipo;Categoria;Valor;Data\n"
+        f"{first_cpf};divida;Mensalidade;100,50;05/01/2024\n"
+        f"{first_cpf};entrada;Mensalidade;40;2024-01-20\n"
+        f"{int(second_cpf)};Dívida;Cantina;12.5;10/01/2024\n" # Leading zeros lost by a spreadsheet
+        "99999999999;divida;Cantina;1;10/01/2024\n"
+        f"{first_cpf};divida;Cantina;abc;10/01/2024\n",
+        encoding="utf-8"
+    )
+
+    assert _import(path) == ["3 registros importados com sucesso! (2 linhas ignoradas)"]
+    rows = {(r.user_id, r.type_id, r.valor) for r in db.query(Registro)}
+    assert rows == {(first, 0, 100.5), (first, 1, 40.0), (second, 0, 12.5)}
+    assert rebuild_balances.verify(db) == []
+
+
+def test_xlsx_import_through_the_controller(db, users, tmp_path):
+    openpyxl = pytest.importorskip("openpyxl")
+    (first, first_cpf), _ = list(users.items())[:2]
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(["cpf", "tipo", "categoria", "valor", "data", "data_prevista"])
+    sheet.append([first_cpf, "DEBT", "Excursão", 80, datetime(2024, 5, 2), datetime(2024, 5, 30)])
+    sheet.append([first_cpf, "PAYMENT", "Excursão", 30.25, datetime(2024, 5, 3), None])
+    path = tmp_path / "import.xlsx"
+    workbook.save(path)
+
+    assert _import(path) == ["2 registros importados com sucesso!"]
+    debt = db.query(Registro).filter(Registro.type_id == 0).one()
+    assert (debt.user_id, debt.valor, debt.data_debito, debt.data_prevista) == (first, 80.0, date(2024, 5, 2), date(2024, 5, 30))
+    assert debt.saldo == 49.75
+    assert rebuild_balances.verify(db) == []
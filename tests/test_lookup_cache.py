@@ -0,0 +1,48 @@
+from datetime import date
+
+import pytest
+from database import change_feed
+from database.models import Categoria
+from repositories.lookup_cache import categorias_cache
+from repositories.transaction_repository import RegistroRepository
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    """Counts the table loads of categorias_cache."""
+    counter = []
+    load = categorias_cache._load
+    monkeypatch.setattr(categorias_cache, "_load", lambda db, **kwargs: counter.append(1) or load(db, **kwargs))
+    return counter
+
+
+def test_unknown_names_reload_once_until_invalidated(db, loads):
+    assert categorias_cache.get_id(db, "Cantina") is not None
+    for _ in range(5):
+        assert categorias_cache.get_id(db, "Cantnia") is None
+        assert categorias_cache.get_name(db, 9999) is None
+    assert len(loads) == 3 # First load, then one reload per unknown key
+
+    # Created by another process: its change feed message drops the cache
+    db.add(Categoria(categoria="Cantnia", repete=False))
+    db.commit()
+    assert categorias_cache.get_id(db, "Cantnia") is None
+    change_feed._caches["categorias"]()
+    assert categorias_cache.get_id(db, "Cantnia") is not None
+
+
+def test_update_with_an_unknown_category_does_not_reload_every_time(db, users, loads):
+    user_id = next(iter(users))
+    repo = RegistroRepository(db)
+    trans = repo.create(user_id, "DEBT", "Cantina", 10.0, date(2024, 1, 5))
+    loads.clear()
+    for _ in range(3):
+        repo.update(trans.id, category="Cantnia")
+    assert len(loads) == 1
+
+
+def test_a_category_created_here_is_found_after_a_miss(db, users):
+    user_id = next(iter(users))
+    assert categorias_cache.get_id(db, "Excursão") is None
+    trans = RegistroRepository(db).create(user_id, "DEBT", "Excursão", 80.0, date(2024, 5, 2))
+    assert categorias_cache.get_id(db, "Excursão") == trans.category_id
@@ -0,0 +1,27 @@
+from datetime import date
+
+from repositories.transaction_repository import RegistroRepository
+from repositories.user_repository import UsuarioRepository
+
+
+def test_user_search_treats_wildcards_literally(db):
+    repo = UsuarioRepository(db)
+    repo.create("11111111111", "Ana 100%")
+    repo.create("22222222222", "Bruno_Silva")
+
+    assert [u.nome for u in repo.search("0%")[0]] == ["Ana 100%"]
+    assert [u.nome for u in repo.search("o_s")[0]] == ["Bruno_Silva"]
+    assert repo.search("o%s") == ([], 0)
+
+
+def test_page_past_the_end_still_reports_the_total(db, users):
+    user_id = next(iter(users))
+    repo = RegistroRepository(db)
+    for day in range(1, 6):
+        repo.create(user_id, "DEBT", "Cantina", 10.0, date(2024, 1, day))
+
+    page, total = repo.search("DEBT", "cantina", offset=2, limit=2)
+    assert (len(page), total) == (2, 5)
+    assert repo.search("DEBT", "cantina", offset=10, limit=2) == ([], 5)
+    assert repo.get_with_filters(tipo="DEBT", offset=10, limit=2) == ([], 5)
+    assert repo.search("PAYMENT", offset=10, limit=2) == ([], 0)
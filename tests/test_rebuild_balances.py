@@ -0,0 +1,72 @@
+from datetime import date
+
+import rebuild_balances
+from sqlalchemy import update
+from database.models import Registro
+from repositories import balance_engine
+from repositories.fechamento_repository import FechamentoRepository
+from repositories.transaction_repository import RegistroRepository
+
+
+def _rebuild(db):
+    """What rebuild_balances.py runs."""
+    repo = RegistroRepository(db)
+    repo.rebuild_balances()
+    repo.rebuild_ledger()
+    FechamentoRepository(db).rebuild_checkpoints()
+    db.commit()
+
+
+def test_manual_fix_in_a_closed_period_survives_later_writes(db, users):
+    user_id = next(iter(users))
+    repo = RegistroRepository(db)
+    debt_id = repo.create(user_id, "DEBT", "Mensalidade", 100.0, date(2024, 1, 5)).id
+    payment_id = repo.create(user_id, "PAYMENT", "Mensalidade", 40.0, date(2024, 1, 20)).id
+    FechamentoRepository(db).fechar(date(2024, 1, 31))
+
+    # Fixed by hand in the database: the payment was 100, not 40
+    db.execute(update(Registro).where(Registro.id == payment_id).values(valor=100.0))
+    db.commit()
+    assert rebuild_balances.verify(db) != [] # balances, ledger and checkpoint are stale
+
+    _rebuild(db)
+    assert rebuild_balances.verify(db) == []
+
+    # A later write recomputes from the rebuilt checkpoint
+    RegistroRepository(db).create(user_id, "DEBT", "Mensalidade", 10.0, date(2024, 2, 15))
+    assert rebuild_balances.verify(db) == []
+    db.expire_all()
+    debt = db.get(Registro, debt_id)
+    assert (debt.saldo, debt.classificacao_id) == (0.0, balance_engine.PAGO)
+
+
+def test_rebuild_balances_matches_the_python_engine(db, users):
+    (first, _), (second, _) = list(users.items())[:2]
+    repo = RegistroRepository(db)
+    same_day = date(2024, 2, 1)
+    undated = []
+    for user_id in (first, second):
+        # Tied dates (creation order decides), amounts that are not exact in binary, zeros, undated rows
+        for amount in (0.1, 0.2, 0.0, 10.0):
+            repo.create(user_id, "DEBT", "Mensalidade", amount, same_day)
+        undated.append(repo.create(user_id, "DEBT", "Mensalidade", 5.0, date(2024, 2, 9)).id)
+        repo.create(user_id, "PAYMENT", "Mensalidade", 0.1 + 0.2, same_day)
+        undated.append(repo.create(user_id, "PAYMENT", "Mensalidade", 3.0, date(2024, 1, 9)).id)
+        repo.create(user_id, "DEBT", "Cantina", 0.0, date(2024, 2, 2))
+    repo.create(second, "PAYMENT", "Cantina", 7.5, date(2024, 2, 3)) # Only credit
+
+    # Scrambled by hand: undated rows, NULLs, wrong statuses, float noise
+    db.execute(update(Registro).where(Registro.id.in_(undated)).values(data_debito=None, data_entrada=None))
+    db.execute(update(Registro).where(Registro.type_id == 0, Registro.id % 3 == 0).values(saldo=None))
+    db.execute(update(Registro).where(Registro.type_id == 0, Registro.id % 3 == 1).values(
+        saldo=Registro.valor + 0.005, classificacao_id=balance_engine.PARCIAL
+    ))
+    db.execute(update(Registro).where(Registro.type_id == 0, Registro.id % 3 == 2).values(classificacao_id=None))
+    db.commit()
+    RegistroRepository(db).rebuild_ledger() # Undated rows move in the queue; only the balances are left stale
+    assert rebuild_balances.verify(db)
+    assert all(what.startswith("dívida") for what, _, _ in rebuild_balances.verify(db))
+
+    assert RegistroRepository(db).rebuild_balances() > 0
+    assert rebuild_balances.verify(db) == []
+    assert RegistroRepository(db).rebuild_balances() == 0
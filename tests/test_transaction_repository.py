@@ -0,0 +1,38 @@
+from datetime import date
+
+import pytest
+from database import change_feed
+from database.models import Categoria, Registro
+from repositories.fechamento_repository import FechamentoRepository
+from repositories.lookup_cache import categorias_cache
+from repositories.transaction_repository import RegistroRepository, PeriodoFechadoError
+
+
+@pytest.fixture
+def published(monkeypatch):
+    messages = []
+    monkeypatch.setattr(change_feed, "_sinks", [messages.append])
+    return messages
+
+
+def test_unknown_category_is_committed_and_published_with_the_record(db, users, published):
+    user_id = next(iter(users))
+    trans = RegistroRepository(db).create(user_id, "DEBT", "Excursão", 80.0, date(2024, 5, 2))
+
+    assert categorias_cache.get_name(db, trans.category_id) == "Excursão"
+    [message] = published
+    assert message["invalidate"] == ["categorias"]
+    assert [e["id"] for e in message["registros"]] == [trans.id]
+
+
+def test_failed_create_leaves_no_new_category(db, users, published):
+    user_id = next(iter(users))
+    FechamentoRepository(db).fechar(date(2024, 1, 31))
+    published.clear()
+
+    with pytest.raises(PeriodoFechadoError):
+        RegistroRepository(db).create(user_id, "DEBT", "Excursão", 80.0, date(2024, 1, 10))
+
+    assert db.query(Categoria).filter(Categoria.categoria == "Excursão").count() == 0
+    assert db.query(Registro).count() == 0
+    assert published == []